@@ -16,7 +16,7 @@ from agents import (
 )
 from agents.mcp import MCPServerStdio
 
-from src.config import Config
+from src.config import get_config
 from src.logging_config import configure_logging
 
 app_logger = logging.getLogger("llm_http_server_app")
@@ -96,7 +96,7 @@ async def main():
         loop.add_signal_handler(sig, _signal_handler)
 
     # Load configuration
-    config = Config()
+    config = get_config()
 
     # Load default system prompt if not already set
     if not config.system_prompt_template:
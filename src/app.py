@@ -27,36 +27,152 @@ This module contains the core request handler. The application factory
 and startup/shutdown logic has been moved to the new orchestration system.
 """
 
-import json
+import asyncio
+import copy
+import functools
+import logging
 import os
+import re
 import time
 from email.utils import formatdate
+from types import MappingProxyType
+from typing import Callable, Mapping, NamedTuple
 
 import jinja2
 from aiohttp import web
-from agents import Runner, SQLiteSession
+from agents import Agent, Runner
 
-from src.config import Config
+from src.config import Config, get_config
 from src.logging_config import configure_logging, get_loggers
-from src.server.errors import send_llm_error_response_aiohttp
+from src.server.conversation_sessions import ConversationSessionCache
+from src.server.global_state import VersionedState
+from src.server.jinja_env import compile_template
 from src.server.parsing import get_raw_request_str
 from src.server.streaming import StreamingContext
 
-# Initialize Jinja2 environment
-jinja_env = jinja2.Environment(
-    loader=jinja2.FileSystemLoader("."),
-    autoescape=jinja2.select_autoescape(["html", "xml"]),
-)
+# A template made only of literal text and bare ``{{ name }}`` substitutions
+_SIMPLE_VAR_RE = re.compile(r"\{\{\s*([A-Za-z_][A-Za-z0-9_]*)\s*\}\}")
+_NEWLINE_RE = re.compile(r"\r\n|\r")
+_JINJA_CONSTANTS = frozenset({"true", "false", "none", "True", "False", "None"})
 
 
-# Initialize Jinja2 environment
-jinja_env = jinja2.Environment(
-    loader=jinja2.FileSystemLoader("."),
-    autoescape=jinja2.select_autoescape(["html", "xml"]),
-)
+class _PromptContext(dict):
+    """
+    Per-request template variables layered over a shared, read-only base.
+
+    Lookups fall back to the base mapping and then to "", which is how Jinja
+    renders unknown variables, so the base never has to be copied per request.
+    """
+
+    __slots__ = ("base",)
+
+    def __init__(self, base: Mapping[str, object]):
+        super().__init__()
+        self.base = base
+
+    def __missing__(self, key: str) -> object:
+        return self.base.get(key, "")
+
+    def flatten(self) -> dict:
+        """Merge the base and per-request values into a plain dict for Jinja."""
+        return {**self.base, **self}
+
+
+@functools.lru_cache(maxsize=16)
+def _compile_format_string(source: str) -> str | None:
+    """
+    Translate a template into an equivalent str.format_map() pattern.
+
+    Only templates consisting of literal text and bare ``{{ name }}``
+    substitutions are translated; anything else (blocks, comments, filters,
+    expressions, whitespace control) returns None so the caller uses Jinja.
+    Newlines are normalized and a single trailing newline dropped, matching
+    the default Jinja environment.
+    """
+    if "{%" in source or "{#" in source:
+        return None
+
+    parts = []
+    pos = 0
+    for match in _SIMPLE_VAR_RE.finditer(source):
+        literal = source[pos : match.start()]
+        name = match.group(1)
+        if "{{" in literal or name in _JINJA_CONSTANTS:
+            return None
+        parts.append(literal.replace("{", "{{").replace("}", "}}"))
+        parts.append("{" + name + "}")
+        pos = match.end()
+    tail = source[pos:]
+    if "{{" in tail:
+        return None
+    if tail.endswith("\r\n"):
+        tail = tail[:-2]
+    elif tail.endswith(("\n", "\r")):
+        tail = tail[:-1]
+    parts.append(tail.replace("{", "{{").replace("}", "}}"))
+
+    return _NEWLINE_RE.sub("\n", "".join(parts))
+
+
+def compile_prompt(source: str) -> Callable[[Mapping[str, object]], str]:
+    """
+    Compile a prompt template once into a render(context) callable.
+
+    Templates that only substitute bare variables render with str.format_map();
+    everything else renders through Jinja. Raises TemplateSyntaxError for an
+    invalid template, so callers compiling at startup fail fast.
+    """
+    format_string = _compile_format_string(source)
+    if format_string is not None:
+
+        def render(context: Mapping[str, object]) -> str:
+            if not isinstance(context, _PromptContext):
+                context = _PromptContext(context)
+            return format_string.format_map(context)
+
+        return render
+
+    template = compile_template(source)
+
+    def render_jinja(context: Mapping[str, object]) -> str:
+        if isinstance(context, _PromptContext):
+            context = context.flatten()
+        return template.render(context)
+
+    return render_jinja
+
+
+# (epoch second, HTTP date string) for the most recent _http_date_now() call
+_http_date_cache: tuple[int, str] = (0, "")
+
+
+def _http_date_now() -> str:
+    """Return the current time as an HTTP date, formatting at most once a second."""
+    global _http_date_cache
+    now = int(time.time())
+    second, http_date = _http_date_cache
+    if second != now:
+        http_date = formatdate(now, usegmt=True)
+        _http_date_cache = (now, http_date)
+    return http_date
+
+
+def _agent_with_instructions(agent: Agent, instructions: str) -> Agent:
+    """
+    Return a per-request view of the shared agent with its own instructions.
+
+    Agent.clone() goes through dataclasses.replace(), which re-runs the
+    dataclass __init__ and __post_init__ validation for every request. Only the
+    instructions differ, so a shallow copy that shares tools, model settings and
+    MCP servers with the original is sufficient.
+    """
+    request_agent = copy.copy(agent)
+    request_agent.instructions = instructions
+    return request_agent
+
 
 # Load application configuration
-config: Config = Config()
+config: Config = get_config()
 
 # Configure logging as early as possible using the config's log level
 # But skip if we're in an MCP subprocess (detected via environment variables)
@@ -70,6 +186,92 @@ if not _in_mcp_subprocess:
 app_logger, _, _ = get_loggers()
 
 
+def build_base_jinja_context(config: Config) -> MappingProxyType:
+    """
+    Build the read-only part of the system prompt context for an application.
+
+    Everything here is derived from configuration alone, so it is computed once
+    when the web server starts. The request handler never copies it: it layers
+    a _PromptContext over this mapping and sets only the per-request values
+    (session, global state, date, debug panel) on that.
+    """
+    web_app_dir = config.web_app_dir
+
+    # The web_app_rules may also be a Jinja template
+    rendered_rules = ""
+    if config.web_app_rules:
+        try:
+            rules_template = compile_template(config.web_app_rules)
+            # The rules template may need the web app directory
+            rendered_rules = rules_template.render({"WEB_APP_DIR": web_app_dir})
+        except jinja2.exceptions.TemplateSyntaxError as e:
+            app_logger.warning(
+                f"Jinja2 template syntax error in web_app_rules: {e}. Using raw rules."
+            )
+            rendered_rules = config.web_app_rules
+
+    return MappingProxyType(
+        {
+            "session_id": "",
+            "is_new_session": True,
+            "session_history_count": 0,
+            "global_state": "{}",
+            "context_window_max": str(config.context_window_max),
+            "dynamic_date_example": "",
+            "dynamic_server_name_example": "LLMWebServer/0.1",
+            "WEB_APP_DIR": web_app_dir,
+            "web_app_rules": rendered_rules,
+            "debug_panel_prompt": "",
+        }
+    )
+
+
+class HandlerState(NamedTuple):
+    """
+    Per-application values the request handler needs, resolved once at startup.
+
+    The handler reads this single app key instead of several app keys and
+    config attributes on every request.
+    """
+
+    agent: Agent
+    global_state: VersionedState
+    conversation_sessions: ConversationSessionCache
+    base_jinja_context: Mapping[str, object]
+    render_system_prompt: Callable[[Mapping[str, object]], str]
+    debug_panel_prompt: str
+    model_name: str
+    max_turns: int
+
+
+def build_handler_state(app: web.Application) -> HandlerState:
+    """Bind the request handler's per-app state once the agent is initialized."""
+    config = app["config"]
+    return HandlerState(
+        agent=app["agent"],
+        global_state=app["global_state"],
+        conversation_sessions=app["conversation_sessions"],
+        base_jinja_context=app["base_jinja_context"],
+        render_system_prompt=app["system_prompt_template_compiled"],
+        debug_panel_prompt=(
+            app["debug_panel_prompt"] if app["debug_injection_enabled"] else ""
+        ),
+        model_name=config.openai_model_name,
+        max_turns=config.max_turns,
+    )
+
+
+def load_debug_panel_prompt() -> str:
+    """Read the debug panel prompt, or return "" if it is not available."""
+    debug_prompt_path = os.path.join(os.path.dirname(__file__), "prompts", "debug.md")
+    try:
+        with open(debug_prompt_path, "r", encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        app_logger.warning(f"Debug panel prompt '{debug_prompt_path}' not found.")
+        return ""
+
+
 async def handle_http_request(request: web.Request) -> web.StreamResponse:
     """
     Simplified HTTP request handler.
@@ -81,7 +283,7 @@ async def handle_http_request(request: web.Request) -> web.StreamResponse:
     Core responsibilities:
     - Prepare the system prompt with Jinja templating
     - Run the agent stream
-    - Pass the stream to the LLMResponseStreamer
+    - Pass the stream to a StreamingContext
     - Return the response
     """
     # Handle health check immediately without LLM processing
@@ -94,6 +296,10 @@ async def handle_http_request(request: web.Request) -> web.StreamResponse:
         )
         return response
 
+    # Debug logging below builds extra dicts; skip all of it unless enabled
+    log_debug = app_logger.isEnabledFor(logging.DEBUG)
+    state: HandlerState = request.app["handler_state"]
+
     # Get data from middleware
     client_address_str = request["client_address_str"]
     session_id_from_cookie = request["session_id_from_cookie"]
@@ -112,72 +318,39 @@ async def handle_http_request(request: web.Request) -> web.StreamResponse:
     # Create session for conversation history persistence
     # The SDK automatically stores req/resp pairs and retrieves them on subsequent requests
     session = None
-    if session_id:
-        session = SQLiteSession(
-            session_id=session_id, 
-            db_path="data/http-llm-server.db"
-        )
-        app_logger.debug(
-            "Using SQLiteSession for history",
-            extra={"session_id": session_id}
-        )
-
-    # Determine session context information
     is_new_session = session_id is None
     session_history_count = 0
-
-    # Get session history count if we have a session
-    if session:
-        try:
-            # Get the current session history to count items
-            history_items = await session.get_items()
-            session_history_count = len(history_items)
-            app_logger.debug(
-                "Session history loaded",
-                extra={"session_id": session_id, "history_count": session_history_count}
-            )
-        except Exception as e:
+    if session_id:
+        # Open the session and count its history in one worker thread hop, while
+        # the request body is read
+        (session, history_count), raw_request_text = await asyncio.gather(
+            state.conversation_sessions.get_with_history_count(session_id),
+            get_raw_request_str(request),
+        )
+        if history_count is None:
             app_logger.warning(
-                f"Failed to get session history count: {e}",
+                "Failed to get session history count",
                 extra={"session_id": session_id},
             )
-            session_history_count = 0
-
-    # Get raw request text
-    raw_request_text = await get_raw_request_str(request)
-    request["raw_request_text"] = raw_request_text  # Store for middleware use
-
-    # Load typed config and app state
-    config = request.app["config"]
-    system_prompt_template = config.system_prompt_template
-    agent = request.app["agent"]
-    global_state = request.app["global_state"]
-    max_turns = config.max_turns
-    context_window_max = config.context_window_max
-
-    # Prepare Jinja context for system prompt
-    web_app_file = config.web_app_file
-    web_app_dir = (
-        os.path.dirname(os.path.abspath(web_app_file)) if web_app_file else os.getcwd()
-    )
-
-    # First, render the web_app_rules, which may also be a Jinja template
-    rendered_rules = ""
-    if config.web_app_rules:
-        try:
-            rules_template = jinja2.Template(config.web_app_rules)
-            # The rules template may need the web app directory
-            rendered_rules = rules_template.render({"WEB_APP_DIR": web_app_dir})
-        except jinja2.exceptions.TemplateSyntaxError as e:
-            app_logger.warning(
-                f"Jinja2 template syntax error in web_app_rules: {e}. Using raw rules."
+        else:
+            session_history_count = history_count
+        if log_debug:
+            app_logger.debug(
+                "Using SQLiteSession for history",
+                extra={
+                    "session_id": session_id,
+                    "history_count": session_history_count,
+                },
             )
-            rendered_rules = config.web_app_rules
+    else:
+        # Get raw request text
+        raw_request_text = await get_raw_request_str(request)
+    request["raw_request_text"] = raw_request_text  # Store for middleware use
 
     # Prepare the debug panel prompt if debug mode is enabled
     debug_panel_prompt = ""
-    if config.debug and not request.headers.get("X-Debug-Panel-Injected"):
-        debug_panel_prompt = request.app.get("debug_panel_prompt", "")
+    if state.debug_panel_prompt and "X-Debug-Panel-Injected" not in request.headers:
+        debug_panel_prompt = state.debug_panel_prompt
         app_logger.info(
             "Debug mode active. Injecting debug panel.",
             extra={"client_address": client_address_str},
@@ -188,32 +361,18 @@ async def handle_http_request(request: web.Request) -> web.StreamResponse:
         #     "content": f"Debug panel prompt: {debug_panel_prompt}",
         # })
 
-    jinja_context = {
-        "session_id": session_id or "",
-        "is_new_session": is_new_session,
-        "session_history_count": session_history_count,
-        "global_state": json.dumps(global_state, indent=2),
-        "context_window_max": str(context_window_max),
-        "dynamic_date_example": formatdate(timeval=None, localtime=False, usegmt=True),
-        "dynamic_server_name_example": "LLMWebServer/0.1",
-        "WEB_APP_DIR": web_app_dir,
-        "web_app_rules": rendered_rules,
-        "debug_panel_prompt": debug_panel_prompt,
-    }
-
-    # Render system prompt
-    try:
-        template = jinja2.Template(system_prompt_template)
-        dynamic_system_prompt = template.render(jinja_context)
-    except jinja2.exceptions.TemplateSyntaxError as e:
-        app_logger.exception(f"Jinja2 template syntax error in the system prompt: {e}")
-        return await send_llm_error_response_aiohttp(
-            request,
-            agent,
-            500,
-            "Server Configuration Error",
-            "Invalid system prompt template.",
-        )
+    # Layer the per-request values over the per-app static context
+    jinja_context = _PromptContext(state.base_jinja_context)
+    jinja_context["session_id"] = session_id or ""
+    jinja_context["is_new_session"] = is_new_session
+    jinja_context["session_history_count"] = session_history_count
+    jinja_context["global_state"] = state.global_state.as_json()
+    jinja_context["dynamic_date_example"] = _http_date_now()
+    if debug_panel_prompt:
+        jinja_context["debug_panel_prompt"] = debug_panel_prompt
+
+    # Render system prompt; the template was compiled when the app started
+    dynamic_system_prompt = state.render_system_prompt(jinja_context)
 
     # Prepare messages for LLM - now handled by session
     # messages = [{"role": "system", "content": dynamic_system_prompt}]
@@ -228,35 +387,38 @@ async def handle_http_request(request: web.Request) -> web.StreamResponse:
         },
     )
 
-    # Reset agent instructions and start LLM processing
-    # agent.instructions = None # We now clone the agent with new instructions
-    cloned_agent = agent.clone(instructions=dynamic_system_prompt)
-    app_logger.debug(
-        f"[{client_address_str}] Agent instructions set to: {cloned_agent.instructions}"
-    )
+    # The shared agent is built with instructions=None and never modified;
+    # this request's system prompt goes on its own shallow copy
+    cloned_agent = _agent_with_instructions(state.agent, dynamic_system_prompt)
+    if log_debug:
+        app_logger.debug(
+            "[%s] Agent instructions set to: %s",
+            client_address_str,
+            cloned_agent.instructions,
+        )
 
     # Store timing for middleware
-    llm_call_start_time = time.perf_counter()
-    request["llm_call_start_time"] = llm_call_start_time
+    request["llm_call_start_ns"] = time.monotonic_ns()
 
-    app_logger.debug(
-        "Starting LLM request processing",
-        extra={
-            "client_address": client_address_str,
-            "session_id": session_id or "new",
-            "model": config.openai_model_name,
-            "max_turns": max_turns,
-        },
-    )
+    if log_debug:
+        app_logger.debug(
+            "Starting LLM request processing",
+            extra={
+                "client_address": client_address_str,
+                "session_id": session_id or "new",
+                "model": state.model_name,
+                "max_turns": state.max_turns,
+            },
+        )
 
-    # Log the system prompt and message structure at debug level
-    app_logger.debug(
-        "System prompt length",
-        extra={
-            "client_address": client_address_str,
-            "length": len(dynamic_system_prompt),
-        },
-    )
+        # Log the system prompt and message structure at debug level
+        app_logger.debug(
+            "System prompt length",
+            extra={
+                "client_address": client_address_str,
+                "length": len(dynamic_system_prompt),
+            },
+        )
 
     # Start the agent runner with streaming
     runner_result = Runner.run_streamed(cloned_agent, raw_request_text, session=session)
@@ -300,8 +462,11 @@ async def on_startup(app: web.Application):
         },
     )
 
-    # Initialize global state
-    app["global_state"] = {}
+    # Initialize global state and the conversation history cache
+    app["global_state"] = VersionedState()
+    app["conversation_sessions"] = ConversationSessionCache(
+        history_limit=config.max_history_items
+    )
 
     # Load default system prompt if not already set
     if not config.system_prompt_template:
@@ -313,14 +478,14 @@ async def on_startup(app: web.Application):
                 "Default system prompt 'src/prompts/system.md' not found."
             )
 
+    # Compile the system prompt now so template errors surface at startup
+    app["system_prompt_template_compiled"] = compile_prompt(
+        config.system_prompt_template
+    )
+
     # Load debug panel prompt if debug mode is enabled
-    if config.debug:
-        try:
-            with open("src/prompts/debug.md", "r", encoding="utf-8") as f:
-                app["debug_panel_prompt"] = f.read()
-        except FileNotFoundError:
-            app_logger.warning("Debug panel prompt 'src/prompts/debug.md' not found.")
-            app["debug_panel_prompt"] = ""
+    app["debug_injection_enabled"] = bool(config.debug)
+    app["debug_panel_prompt"] = load_debug_panel_prompt() if config.debug else ""
 
     # Load web app rules if a web app file is specified
     if config.web_app_file:
@@ -332,10 +497,12 @@ async def on_startup(app: web.Application):
                 f"Web app rules file not found: {config.web_app_file}"
             )
 
+    app["base_jinja_context"] = build_base_jinja_context(config)
+
     # Load error prompt template
     try:
         with open("src/prompts/error.md", "r", encoding="utf-8") as f:
-            app["error_llm_system_prompt_template"] = jinja2.Template(f.read())
+            app["error_llm_system_prompt_template"] = compile_template(f.read())
     except FileNotFoundError:
         app_logger.error("Error prompt template 'src/prompts/error.md' not found.")
         app["error_llm_system_prompt_template"] = None
@@ -345,6 +512,8 @@ async def on_startup(app: web.Application):
     if not app["agent"]:
         raise RuntimeError("Agent not initialized by orchestrator")
 
+    app["handler_state"] = build_handler_state(app)
+
     app_logger.info("Application startup complete.")
 
 
@@ -362,4 +531,9 @@ async def on_shutdown(app: web.Application):
     if agent:
         await agent.close()
 
+    # Close the cached conversation sessions' database connections
+    conversation_sessions = app.get("conversation_sessions")
+    if conversation_sessions is not None:
+        conversation_sessions.close()
+
     app_logger.info("Application shutdown complete.")
\ No newline at end of file
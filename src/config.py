@@ -1,17 +1,155 @@
+import functools
 import json
+import os
 import sys
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
-from pydantic import Field, field_validator
-from pydantic_settings import BaseSettings, SettingsConfigDict
+import yaml
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr, field_validator
+from pydantic_settings import BaseSettings, CliSettingsSource, SettingsConfigDict
+
+# Prefer the libyaml-backed loader when PyYAML was built with it
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
 
 # Disable CLI parsing when running under pytest to avoid argument conflicts
 _running_under_pytest = "pytest" in sys.modules
 
+# Parsed web app files keyed by absolute path, stored with the (mtime_ns, size)
+# they were parsed from so an edited file is transparently re-read.
+_WEBAPP_CACHE: dict[str, tuple[int, int, tuple]] = {}
+
+
+def _read_text(path: str) -> str:
+    """
+    Read a whole UTF-8 text file with a single sized read.
+
+    Prompt files are small and read in full, so size the read from fstat
+    instead of going through the TextIOWrapper buffering layer. Newlines are
+    normalized the same way text-mode open() does.
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        size = os.fstat(fd).st_size
+        data = os.read(fd, size)
+        # Short reads are possible (e.g. the file grew); drain until EOF
+        while True:
+            chunk = os.read(fd, max(size, 65536))
+            if not chunk:
+                break
+            data += chunk
+    finally:
+        os.close(fd)
+    content = data.decode("utf-8")
+    if "\r" in content:
+        content = content.replace("\r\n", "\n").replace("\r", "\n")
+    return content
+
+
+def _read_web_app_file(
+    path: str,
+) -> Optional[tuple[Dict[str, Any], Optional[str], List[Dict[str, Any]]]]:
+    """
+    Read a web app file and split it into (metadata, web_app_rules, mcp_servers).
+
+    web_app_rules is None when the file has YAML front matter but no body. The
+    result is cached per file version, so repeated Config constructions only
+    read and YAML-parse a file once until it changes. Returns None if the file
+    cannot be read.
+    """
+    try:
+        abspath = os.path.abspath(path)
+        st = os.stat(abspath)
+    except OSError:
+        return None
+
+    cached = _WEBAPP_CACHE.get(abspath)
+    if cached is not None and cached[:2] == (st.st_mtime_ns, st.st_size):
+        return cached[2]
+
+    try:
+        content = _read_text(abspath)
+    except Exception:
+        return None
+
+    metadata: Dict[str, Any] = {}
+    web_app_rules: Optional[str] = content
+
+    # Locate YAML front matter delimited by "---" lines without a regex scan
+    end = -1
+    if content.startswith("---\n"):
+        end = content.find("\n---\n", 4)
+        if end == -1 and len(content) >= 8 and content.endswith("\n---"):
+            end = len(content) - 4
+    if end != -1:
+        try:
+            parsed_metadata = yaml.load(content[4:end], Loader=_YamlLoader)
+            if isinstance(parsed_metadata, dict):
+                metadata = parsed_metadata
+            # The content after the front matter is the web app rules
+            web_app_rules = content[end + 5 :].strip() or None
+        except yaml.YAMLError:
+            # If YAML parsing fails, use the entire content
+            pass
+
+    servers = metadata.get("mcp_servers")
+    mcp_servers = servers if isinstance(servers, list) else []
+
+    result = (metadata, web_app_rules, mcp_servers)
+    _WEBAPP_CACHE[abspath] = (st.st_mtime_ns, st.st_size, result)
+    return result
+
+
+# Accepted log_level values, in display order for error messages
+_LOG_LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL", "TRACE")
+_VALID_LOG_LEVELS = frozenset(_LOG_LEVELS)
+
+
+@functools.lru_cache(maxsize=1)
+def _default_info_site_path() -> str:
+    """Returns path to the default info site prompt."""
+    # __file__ is src/config.py, so go up one level to find examples
+    return os.path.join(
+        os.path.dirname(os.path.dirname(__file__)),
+        "examples",
+        "default_info_site",
+        "prompt.md",
+    )
+
+
+# Used when src/prompts/system.md cannot be read
+_FALLBACK_SYSTEM_PROMPT = (
+    "You are an advanced AI assistant powering a web server. Your primary "
+    "goal is to act as a fully-featured web server, responding to raw "
+    "HTTP requests with raw HTTP responses. You must generate the "
+    "entire HTTP response, including the status line, headers, and body."
+)
+
+
+@functools.lru_cache(maxsize=1)
+def _system_prompt_text() -> str:
+    """
+    Reads the base system prompt once per process, or returns a fallback.
+
+    The prompt ships with the package and does not change while the server is
+    running, so every Config shares the first successful read.
+    """
+    # __file__ is src/config.py, so src/prompts/system.md is a sibling directory
+    system_prompt_path = os.path.join(os.path.dirname(__file__), "prompts", "system.md")
+    try:
+        return _read_text(system_prompt_path)
+    except Exception:
+        # If we can't load the file, use a basic fallback prompt
+        return _FALLBACK_SYSTEM_PROMPT
 
-class McpServerConfig(BaseSettings):
+
+class McpServerConfig(BaseModel):
     """Pydantic model for a single MCP server's configuration."""
 
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     type: str
     command: Optional[str] = None
     args: Optional[List[str]] = None
@@ -46,6 +184,11 @@ class Config(BaseSettings):
     )
     max_turns: int = Field(default=25, alias="MAX_TURNS")
     context_window_max: int = Field(default=0, alias="CONTEXT_WINDOW_MAX")
+    max_history_items: int = Field(
+        default=0,
+        alias="MAX_HISTORY_ITEMS",
+        description="Send at most this many recent history items; 0 sends all.",
+    )
     web_app_file: Optional[str] = Field(default=None, alias="WEB_APP_FILE")
     save_conversations: bool = Field(default=False, alias="SAVE_CONVERSATIONS")
     local_tools_enabled: bool = Field(default=True, alias="LOCAL_TOOLS_ENABLED")
@@ -59,13 +202,18 @@ class Config(BaseSettings):
     debug: bool = Field(default=False, alias="DEBUG")
 
     # The following fields are not loaded from env but are set programmatically
-    mcp_servers: List[Dict[str, Any]] = Field(default_factory=list)
-    webapp_metadata: Dict[str, Any] = Field(default_factory=dict)
+    mcp_servers: Tuple[McpServerConfig, ...] = ()
     system_prompt_template: str = ""
     error_llm_system_prompt_template: str = ""
-    web_app_rules: str = ""
+    web_app_dir: str = ""
     openai_max_tokens: Optional[int] = None
 
+    # Web app content is read from web_app_file on first access; see
+    # the webapp_metadata and web_app_rules properties
+    _webapp_metadata: Dict[str, Any] = PrivateAttr(default_factory=dict)
+    _web_app_rules: str = PrivateAttr(default="")
+    _web_app_loaded: bool = PrivateAttr(default=False)
+
     @field_validator("mcp_servers", mode="before")
     def parse_mcp_servers(cls, v):
         if isinstance(v, str):
@@ -77,13 +225,13 @@ class Config(BaseSettings):
 
     @field_validator("log_level")
     def validate_log_level(cls, v):
-        valid_levels = ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL", "TRACE"]
-        if v.upper() not in valid_levels:
-            raise ValueError(f"log_level must be one of {valid_levels}")
-        return v.upper()
+        level = v.upper()
+        if level not in _VALID_LOG_LEVELS:
+            raise ValueError(f"log_level must be one of {list(_LOG_LEVELS)}")
+        return level
 
     def __init__(self, **kwargs):
-        """Initialize Config and load web app content if web_app_file is provided."""
+        """Initialize Config and resolve the web app file and directory."""
         # Check if web_app_file was explicitly passed
         explicit_web_app_file = kwargs.get("web_app_file")
 
@@ -91,6 +239,11 @@ class Config(BaseSettings):
         if "web_app_file" in kwargs:
             del kwargs["web_app_file"]
 
+        # Reuse the argv parse from the first Config instead of rebuilding the
+        # CLI parser for every instance
+        if not _running_under_pytest:
+            kwargs.setdefault("_cli_settings_source", _cli_settings_source())
+
         super().__init__(**kwargs)
 
         # Always load the base system prompt first.
@@ -102,117 +255,102 @@ class Config(BaseSettings):
         elif not self.web_app_file:
             self.web_app_file = self._get_default_info_site_path()
 
-        # Load web app content if web_app_file is provided (which now includes
-        # the default)
-        if self.web_app_file:
-            self._load_web_app_content()
+        # Resolve the web app directory once so request handlers don't have to
+        self.web_app_dir = (
+            os.path.dirname(os.path.abspath(self.web_app_file))
+            if self.web_app_file
+            else os.getcwd()
+        )
 
     def _get_default_info_site_path(self) -> str:
         """Returns path to the default info site prompt."""
-        import os
-
-        # __file__ is src/config.py, so go up one level to find examples
-        default_path = os.path.join(
-            os.path.dirname(os.path.dirname(__file__)),
-            "examples",
-            "default_info_site",
-            "prompt.md",
-        )
-        return default_path
+        return _default_info_site_path()
 
     def _load_system_prompt(self):
         """Loads the system prompt from a file or uses a fallback."""
-        import os
-
-        # Try to load from src/prompts/system.md relative to project root
-        # __file__ is src/config.py, so go up one level to get to
-        # src/prompts/system.md
-        system_prompt_path = os.path.join(
-            os.path.dirname(__file__), "prompts", "system.md"
-        )
-        try:
-            with open(system_prompt_path, "r", encoding="utf-8") as f:
-                self.system_prompt_template = f.read()
-        except Exception:
-            # If we can't load the file, use a basic fallback prompt
-            self.system_prompt_template = (
-                "You are an advanced AI assistant powering a web server. Your primary "
-                "goal is to act as a fully-featured web server, responding to raw "
-                "HTTP requests with raw HTTP responses. You must generate the "
-                "entire HTTP response, including the status line, headers, and body."
-            )
+        self.system_prompt_template = _system_prompt_text()
+
+    @property
+    def webapp_metadata(self) -> Dict[str, Any]:
+        """YAML front matter from the web app file."""
+        self._load_web_app_content()
+        return self._webapp_metadata
+
+    @webapp_metadata.setter
+    def webapp_metadata(self, value: Dict[str, Any]) -> None:
+        self._load_web_app_content()
+        self._webapp_metadata = value
+
+    @property
+    def web_app_rules(self) -> str:
+        """The body of the web app file, after any front matter."""
+        self._load_web_app_content()
+        return self._web_app_rules
+
+    @web_app_rules.setter
+    def web_app_rules(self, value: str) -> None:
+        self._load_web_app_content()
+        self._web_app_rules = value
 
     def _load_web_app_content(self) -> None:
-        """Load content from the web app file into configuration fields."""
-        import os
-        import re
+        """
+        Load content from the web app file on first use.
 
-        import yaml
+        Deferred so a Config that is only consulted for settings such as host
+        and port never reads or YAML-parses the web app file.
+        """
+        if self._web_app_loaded:
+            return
+        self._web_app_loaded = True
+        if not self.web_app_file:
+            return
 
-        if not os.path.exists(self.web_app_file):
+        parsed = _read_web_app_file(self.web_app_file)
+        if parsed is None:
             return
 
-        try:
-            with open(self.web_app_file, "r", encoding="utf-8") as f:
-                content = f.read()
-
-            # Extract YAML front matter and content
-            yaml_match = re.match(r"^---\n(.*?)\n---\n(.*)", content, re.DOTALL)
-            if yaml_match:
-                try:
-                    # Parse YAML metadata
-                    metadata = yaml.safe_load(yaml_match.group(1))
-                    if metadata:
-                        self.webapp_metadata = metadata
-
-                        # Extract MCP servers for later use
-                        if "mcp_servers" in metadata:
-                            # Note: MCP servers are handled separately in core_services
-                            pass
-
-                    # Extract content portion as system prompt template
-                    content_portion = yaml_match.group(2).strip()
-                    if content_portion:
-                        self.web_app_rules = content_portion
-
-                except yaml.YAMLError:
-                    # If YAML parsing fails, use the entire content
-                    self.web_app_rules = content
-            else:
-                # No YAML front matter, use entire content
-                self.web_app_rules = content
-
-        except Exception:
-            # On any error, silently continue without web app content
-            pass
+        metadata, web_app_rules, _ = parsed
+        if metadata:
+            # Copy so callers mutating this Config don't touch the shared cache
+            self._webapp_metadata = dict(metadata)
+        if web_app_rules is not None:
+            self._web_app_rules = web_app_rules
 
     @classmethod
     def parse_web_app_file(cls, web_app_file: str) -> List[Dict[str, Any]]:
         """Parse web app file and extract MCP server configurations."""
-        import os
-        import re
+        parsed = _read_web_app_file(web_app_file)
+        if parsed is None:
+            return []
+        return list(parsed[2])
 
-        import yaml
 
-        if not os.path.exists(web_app_file):
-            return []
+@functools.lru_cache(maxsize=1)
+def _cli_settings_source() -> CliSettingsSource:
+    """Parses sys.argv once for every Config built in this process."""
+    return CliSettingsSource(
+        Config,
+        cli_parse_args=True,
+        cli_prog_name=Config.model_config["cli_prog_name"],
+        case_sensitive=Config.model_config.get("case_sensitive", False),
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _config_template(web_app_file: Optional[str]) -> Config:
+    """Build the Config that get_config() copies; never handed out directly."""
+    if web_app_file is None:
+        return Config()
+    return Config(web_app_file=web_app_file)
 
-        try:
-            with open(web_app_file, "r", encoding="utf-8") as f:
-                content = f.read()
-
-            # Extract YAML front matter
-            yaml_match = re.match(r"^---\n(.*?)\n---", content, re.DOTALL)
-            if yaml_match:
-                try:
-                    metadata = yaml.safe_load(yaml_match.group(1))
-                    if metadata and "mcp_servers" in metadata:
-                        servers = metadata["mcp_servers"]
-                        if isinstance(servers, list):
-                            return servers
-                except yaml.YAMLError:
-                    pass
-        except Exception:
-            pass
 
-        return []
+def get_config(web_app_file: Optional[str] = None) -> Config:
+    """
+    Return a Config for web_app_file, built from a cached template.
+
+    Building a Config parses the CLI, reads .env and runs the validators, so
+    that is done once per web app file. Each call returns its own deep copy,
+    so callers may modify it without affecting anyone else, and the web app
+    content is loaded lazily from the file (re-read when it changes on disk).
+    """
+    return _config_template(web_app_file).model_copy(deep=True)
@@ -1,6 +1,48 @@
 """DSPy metric function for validating HTTP responses."""
 
 
+def _find_header_end(response):
+    """
+    Locate the blank line separating headers from body.
+    
+    Returns (index, separator length), or (-1, 0) if there is no separator.
+    CRLF framing is preferred, falling back to bare newlines.
+    """
+    header_end = response.find("\r\n\r\n")
+    if header_end != -1:
+        return header_end, 4
+    header_end = response.find("\n\n")
+    if header_end != -1:
+        return header_end, 2
+    return -1, 0
+
+
+# Structural checks made by http_response_metric, as bit flags
+_HAS_PREFIX = 1  # starts with "HTTP/1.1 "
+_HAS_STATUS = 2  # status line carries a numeric code in 100-599
+_HAS_SEPARATOR = 4  # blank line between headers and body
+_HAS_CONTENT_TYPE = 8  # Content-Type header present
+_ALL_CHECKS = 15
+
+
+def _structural_score(flags):
+    """Score a set of check flags; the first failing check decides."""
+    if not flags & _HAS_PREFIX:
+        return 0.0
+    if not flags & _HAS_STATUS:
+        return 0.3
+    if not flags & _HAS_SEPARATOR:
+        return 0.5
+    if not flags & _HAS_CONTENT_TYPE:
+        return 0.7
+    return 1.0
+
+
+# Precomputed so the metric does one table lookup instead of a branch cascade.
+# Index is the OR of the flags above, e.g. 0b0111 (no Content-Type) -> 0.7.
+_SCORE_TABLE = tuple(_structural_score(flags) for flags in range(_ALL_CHECKS + 1))
+
+
 def http_response_metric(example, pred, trace=None):
     """
     Validate HTTP response quality.
@@ -17,58 +59,71 @@ def http_response_metric(example, pred, trace=None):
         pred: The prediction from the DSPy program
         trace: Optional trace of intermediate LM calls (for optimization)
     """
-    response = pred.http_response
+    return _score_http_response(example, pred.http_response)[0]
+
+
+def _score_http_response(example, response):
+    """
+    Score a raw HTTP response for http_response_metric.
+    
+    Returns (score, header_end, separator_len) so callers that need the body
+    can slice it out without scanning for the separator again.
+    """
+    flags = 0
     
     # Check starts with valid HTTP status line
-    if not response.startswith("HTTP/1.1 "):
-        return 0.0
+    if response.startswith("HTTP/1.1 "):
+        flags |= _HAS_PREFIX
     
-    # Parse status line
-    lines = response.split("\r\n")
-    if len(lines) < 2:
-        lines = response.split("\n")  # Fallback for \n only
-    
-    status_line = lines[0]
-    parts = status_line.split(" ", 2)
-    if len(parts) < 3:
-        return 0.3  # Malformed status line
-    
-    # Validate status code is numeric
-    try:
-        status_code = int(parts[1])
-        if not (100 <= status_code <= 599):
-            return 0.3
-    except ValueError:
-        return 0.3
+    # Locate the end of the status line once instead of splitting every line
+    eol = response.find("\r\n")
+    if eol == -1:
+        eol = response.find("\n")  # Fallback for \n only
+        if eol == -1:
+            eol = len(response)
+    
+    # The code follows the validated "HTTP/1.1 " prefix and ends at the next space
+    status_code = 0
+    code_end = response.find(" ", 9, eol)
+    if code_end != -1:
+        try:
+            status_code = int(response[9:code_end])
+        except ValueError:
+            pass
+    if 100 <= status_code <= 599:
+        flags |= _HAS_STATUS
     
     # Check has blank line separating headers from body
-    has_separator = "\r\n\r\n" in response or "\n\n" in response
-    if not has_separator:
-        return 0.5
+    header_end, separator_len = _find_header_end(response)
+    if header_end != -1:
+        flags |= _HAS_SEPARATOR
+        # Check has required headers, scanning only the header section
+        if "Content-Type:" in response[:header_end]:
+            flags |= _HAS_CONTENT_TYPE
     
-    # Check has required headers
-    if "Content-Type:" not in response:
-        return 0.7
+    score = _SCORE_TABLE[flags]
+    if flags != _ALL_CHECKS:
+        return score, header_end, separator_len
     
     # If we have expected output, compare key elements
-    if hasattr(example, 'http_response'):
-        expected = example.http_response
-        
-        # Parse expected status code
-        expected_parts = expected.split(" ", 2)
-        if len(expected_parts) >= 2:
+    expected = getattr(example, "http_response", None)
+    if expected is not None:
+        # Parse expected status code: the token after the first space
+        code_start = expected.find(" ") + 1
+        if code_start:
+            code_end = expected.find(" ", code_start)
+            if code_end == -1:
+                code_end = len(expected)
             try:
-                expected_code = int(expected_parts[1])
-                # Bonus for matching status code
-                if status_code == expected_code:
-                    return 1.0
-                # Penalty for wrong status code class (e.g., 200 vs 404)
-                if status_code // 100 != expected_code // 100:
-                    return 0.8
+                expected_code = int(expected[code_start:code_end])
             except ValueError:
                 pass
+            else:
+                # Penalty for wrong status code class (e.g., 200 vs 404)
+                if status_code // 100 != expected_code // 100:
+                    score = 0.8
     
-    return 1.0
+    return score, header_end, separator_len
 
 
 def strict_http_metric(example, pred, trace=None):
@@ -77,31 +132,37 @@ def strict_http_metric(example, pred, trace=None):
     
     Use this during evaluation, not during optimization (too strict).
     """
-    base_score = http_response_metric(example, pred, trace)
+    response = pred.http_response
+    base_score, header_end, separator_len = _score_http_response(example, response)
     if base_score < 0.7:
         return base_score
     
-    response = pred.http_response
+    # A score of 0.7 or more means the header/body separator was found
+    body = response[header_end + separator_len:].strip()
     
     # Check Content-Type matches body
     if "application/json" in response:
         # Body should look like JSON
-        parts = response.split("\r\n\r\n", 1)
-        if len(parts) < 2:
-            parts = response.split("\n\n", 1)
-        if len(parts) >= 2:
-            body = parts[1].strip()
-            if not (body.startswith("{") or body.startswith("[")):
-                return base_score * 0.9
+        if body[:1] not in ("{", "["):
+            return base_score * 0.9
     
     if "text/html" in response:
-        # Body should look like HTML
-        parts = response.split("\r\n\r\n", 1)
-        if len(parts) < 2:
-            parts = response.split("\n\n", 1)
-        if len(parts) >= 2:
-            body = parts[1].strip().lower()
-            if not ("<html" in body or "<!doctype" in body or "<" in body):
-                return base_score * 0.9
+        # Body should look like HTML; any tag will do
+        if "<" not in body:
+            return base_score * 0.9
     
     return base_score
+
+
+def http_response_metric_batch(examples, preds):
+    """
+    Score many (example, prediction) pairs with http_response_metric.
+    
+    For offline evaluation over a whole dataset, where calling the metric
+    through DSPy one example at a time adds per-call dispatch. DSPy optimizers
+    still take the single-example http_response_metric.
+    
+    Returns a list of scores in the same order as the inputs.
+    """
+    metric = http_response_metric
+    return [metric(example, pred) for example, pred in zip(examples, preds)]
@@ -1,4 +1,7 @@
 
+import functools
+import os
+
 import dspy
 
 class GenerateHttpResponse(dspy.Signature):
@@ -23,3 +26,21 @@ class HttpProgram(dspy.Module):
 
     def forward(self, context, http_request):
         return self.generate_response(context=context, http_request=http_request)
+
+
+@functools.lru_cache(maxsize=4)
+def _load_compiled_program(path, mtime_ns):
+    program = HttpProgram()
+    program.load(path)
+    return program
+
+
+def load_compiled_program(path):
+    """
+    Load a compiled HttpProgram saved with HttpProgram.save().
+
+    The loaded program is reused across calls until the file on disk changes,
+    so callers don't rebuild the module and re-read its demos per request.
+    Raises FileNotFoundError if nothing has been saved at path yet.
+    """
+    return _load_compiled_program(path, os.stat(path).st_mtime_ns)
@@ -1,52 +1,264 @@
+import atexit
+import copy
 import logging
+import queue
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import TextIO
 
+import orjson
+from rich.console import Console
 from rich.logging import RichHandler
 
+# Layout for non-interactive output, where Rich's styling only adds overhead
+_PLAIN_LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s %(message)s"
+
+
+# The application's loggers, resolved once; logging.getLogger() always hands
+# back these same objects for these names
+_LOGGERS = (
+    logging.getLogger("llm_http_server_app"),
+    logging.getLogger("http_access"),
+    logging.getLogger("conversation_history"),
+)
+
+
+# Third-party loggers held to the dependency log level, resolved once
+_NOISY_DEP_LOGGERS = tuple(
+    logging.getLogger(name)
+    for name in ("urllib3", "httpcore", "httpx", "aiohttp", "openai", "agents", "mcp")
+)
+
 
 def get_loggers():
     """Returns the standard loggers for the application."""
-    return (
-        logging.getLogger("llm_http_server_app"),
-        logging.getLogger("http_access"),
-        logging.getLogger("conversation_history"),
-    )
+    return _LOGGERS
 
 
 # Define standard keys to separate them from user-provided 'extra' fields
-_STANDARD_LOG_RECORD_KEYS = set(
-    logging.LogRecord(
-        "dummy", logging.INFO, "dummy.py", 0, "dummy", (), None
-    ).__dict__.keys()
+_LOG_RECORD_INIT_KEYS = frozenset(
+    {
+        # Set by LogRecord.__init__ (taskName since Python 3.12)
+        "name",
+        "msg",
+        "args",
+        "levelname",
+        "levelno",
+        "pathname",
+        "filename",
+        "module",
+        "exc_info",
+        "exc_text",
+        "stack_info",
+        "lineno",
+        "funcName",
+        "created",
+        "msecs",
+        "relativeCreated",
+        "thread",
+        "threadName",
+        "processName",
+        "process",
+        "taskName",
+    }
 )
+_STANDARD_LOG_RECORD_KEYS = _LOG_RECORD_INIT_KEYS | {
+    # Added by Formatter.format() once any handler has formatted the record
+    "message",
+    "asctime",
+}
+# Every record has at least these keys, so one with exactly this many has no
+# extras and has not been formatted yet
+_LOG_RECORD_INIT_KEY_COUNT = len(_LOG_RECORD_INIT_KEYS)
 
 
 class SingleLineExtrasFilter(logging.Filter):
     """
     A logging filter to format extra parameters into a single line.
 
-    This filter iterates over the 'extra' parameters in a LogRecord,
-    formats them as key=value pairs, and appends them to the log message.
+    This filter collects the 'extra' parameters in a LogRecord, serializes
+    them as one compact JSON object, and appends it to the log message.
     It then removes these keys from the record to prevent RichHandler
     from printing them on separate lines.
     """
 
     def filter(self, record: logging.LogRecord) -> bool:
-        extra = {
-            k: v
-            for k, v in record.__dict__.items()
-            if k not in _STANDARD_LOG_RECORD_KEYS
-        }
-
-        if extra:
-            record.msg = f"{record.getMessage()} | " + " ".join(
-                f"{k}={v}" for k, v in extra.items()
-            )
-            for key in extra:
-                del record.__dict__[key]
+        fields = record.__dict__
+        # Most records carry no extras. Usually the key count alone shows that;
+        # otherwise a C-level set difference settles it without a per-key loop.
+        if (
+            len(fields) > _LOG_RECORD_INIT_KEY_COUNT
+            and fields.keys() - _STANDARD_LOG_RECORD_KEYS
+        ):
+            standard_keys = _STANDARD_LOG_RECORD_KEYS
+            # Collect and remove the extras in insertion order, so they render
+            # as they were passed
+            extras = {k: fields.pop(k) for k in list(fields) if k not in standard_keys}
+            record.msg = f"{record.getMessage()} | {_render_extras(extras)}"
+            # The message is fully formatted now; don't apply the args twice
+            record.args = None
 
         return True
 
 
+def _render_extras(extras: dict) -> str:
+    """
+    Serialize log extras as compact JSON, falling back to key=value pairs.
+
+    Values orjson cannot encode natively are rendered with str(). The
+    fallback covers the few things it rejects outright (such as integers
+    wider than 64 bits), since a filter must never raise into the caller.
+    """
+    try:
+        return orjson.dumps(
+            extras, default=str, option=orjson.OPT_NON_STR_KEYS
+        ).decode()
+    except orjson.JSONEncodeError:
+        return " ".join([f"{k}={v}" for k, v in extras.items()])
+
+
+class _PlainFormatter(logging.Formatter):
+    """
+    The plain console Formatter, producing exactly the base class's output.
+
+    logging.Formatter.formatTime converts and strftime()s the record time for
+    every record. Records logged within the same second share that prefix, so
+    it is formatted once per second and only the milliseconds are added per
+    record.
+
+    Tracebacks and stack info are joined onto the line once, rather than
+    copying the whole message again for each appended piece.
+    """
+
+    _cached_second: int = -1
+    _cached_prefix: str = ""
+
+    def formatTime(self, record: logging.LogRecord, datefmt: str | None = None) -> str:
+        if datefmt:
+            return super().formatTime(record, datefmt)
+        second = int(record.created)
+        if second != self._cached_second:
+            self._cached_prefix = time.strftime(
+                self.default_time_format, self.converter(second)
+            )
+            self._cached_second = second
+        return self.default_msec_format % (self._cached_prefix, record.msecs)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # usesTime() searches the format string; it never changes, so ask once
+        self._uses_time = self.usesTime()
+
+    def format(self, record: logging.LogRecord) -> str:
+        record.message = record.getMessage()
+        if self._uses_time:
+            record.asctime = self.formatTime(record, self.datefmt)
+        line = self.formatMessage(record)
+        exc_text = record.exc_text
+        if record.exc_info and not exc_text:
+            # Cache the traceback text, as the base class does
+            exc_text = record.exc_text = self.formatException(record.exc_info)
+        stack_info = record.stack_info
+        if not exc_text and not stack_info:
+            return line
+
+        parts = [line]
+        last = line
+        for trailer in (exc_text, stack_info and self.formatStack(stack_info)):
+            if trailer:
+                if last[-1:] != "\n":
+                    parts.append("\n")
+                parts.append(trailer)
+                last = trailer
+        return "".join(parts)
+
+
+class _BatchingStreamHandler(logging.StreamHandler):
+    """
+    A StreamHandler that flushes once a burst of queued records is written.
+
+    StreamHandler flushes the stream after every record, which costs a write
+    syscall per line on a redirected stream. When fed from a queue, this one
+    leaves lines in the stream's buffer while more records are waiting, and
+    flushes as soon as it has caught up, so output is never held back.
+    """
+
+    def __init__(self, stream: TextIO, pending: queue.SimpleQueue | None = None):
+        super().__init__(stream)
+        self.pending = pending
+
+    def flush(self):
+        if self.pending is None or self.pending.empty():
+            super().flush()
+
+
+def create_console_handler(
+    stream: TextIO, pending: queue.SimpleQueue | None = None, **rich_options
+) -> logging.Handler:
+    """
+    Build the console log handler for stream, with extras kept on one line.
+
+    Interactive terminals get a RichHandler configured with rich_options.
+    Anything else (pipes, files, log collectors) gets a plain StreamHandler,
+    which skips Rich's markup, styling and layout work on every record. If
+    the handler will be fed from the pending queue, that handler batches its
+    writes until the queue is empty.
+    """
+    if stream.isatty():
+        handler = RichHandler(console=Console(file=stream), **rich_options)
+    else:
+        handler = _BatchingStreamHandler(stream, pending)
+        handler.setFormatter(_PlainFormatter(_PLAIN_LOG_FORMAT))
+    handler.addFilter(SingleLineExtrasFilter())
+    return handler
+
+
+class _InProcessQueueHandler(QueueHandler):
+    """
+    A QueueHandler for a listener running in this same process.
+
+    The stdlib prepare() formats the record and drops exc_info so it can be
+    pickled, which would turn Rich's tracebacks into plain text. Records here
+    never leave the process, so only the message is frozen, against later
+    changes to its arguments, and the exception stays attached.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+# Background thread that writes queued records to the console handler
+_queue_listener: QueueListener | None = None
+
+# Root handlers installed by configure_logging, removed when it runs again
+_owned_handlers: list[logging.Handler] = []
+
+
+def _start_queue_listener(
+    log_queue: queue.SimpleQueue, handler: logging.Handler
+) -> QueueHandler:
+    """Run handler on a background listener and return the handler that feeds it."""
+    global _queue_listener
+    if _queue_listener is None:
+        # Drain whatever is still queued when the interpreter exits
+        atexit.register(_stop_queue_listener)
+    else:
+        _stop_queue_listener()
+
+    _queue_listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    _queue_listener.start()
+    return _InProcessQueueHandler(log_queue)
+
+
+def _stop_queue_listener():
+    if _queue_listener is not None:
+        _queue_listener.stop()
+
+
 def configure_logging(log_level: str = "INFO"):
     """Configure all loggers with the specified log level and consistent formatting."""
     log_level_upper = log_level.upper()
@@ -69,27 +281,33 @@ def configure_logging(log_level: str = "INFO"):
         deps_log_level = logging.WARNING
         actual_level_name = log_level_upper
 
-    # 2. Clear all handlers and reset propagation to default
+    # 2. Remove the handlers a previous call installed. Handlers that other
+    # code attached to its own loggers are left alone, and the logger
+    # hierarchy is not walked.
     root_logger = logging.getLogger()
-    for name in logging.root.manager.loggerDict:
-        logger = logging.getLogger(name)
-        if isinstance(logger, logging.Logger):
-            logger.handlers.clear()
-            logger.propagate = True
-    root_logger.handlers.clear()
+    while _owned_handlers:
+        root_logger.removeHandler(_owned_handlers.pop())
 
     # 3. Configure the root logger
     # The root logger must be set to the most verbose level of all loggers.
+    # Records are only queued on the logging thread; rendering and the stdout
+    # write happen on a background listener, off the request path. Anything
+    # still queued is written at interpreter exit, but records logged after
+    # that point (or before an os._exit) are lost.
     root_logger.setLevel(min(app_log_level, deps_log_level))
-    rich_handler = RichHandler(
+    log_queue = queue.SimpleQueue()
+    console_handler = create_console_handler(
+        sys.stdout,
+        log_queue,
         rich_tracebacks=True,
         show_path=True,
         show_time=True,
         markup=True,
         show_level=True,
     )
-    rich_handler.addFilter(SingleLineExtrasFilter())
-    root_logger.addHandler(rich_handler)
+    queue_handler = _start_queue_listener(log_queue, console_handler)
+    root_logger.addHandler(queue_handler)
+    _owned_handlers.append(queue_handler)
 
     # 4. Set levels for our application-specific loggers
     # They will propagate to the root handler.
@@ -99,18 +317,33 @@ def configure_logging(log_level: str = "INFO"):
 
     # 5. Set specific log levels for noisy third-party libraries
     # This overrides the root logger's level for these specific logger hierarchies.
-    noisy_deps = ["urllib3", "httpcore", "httpx", "aiohttp", "openai", "agents", "mcp"]
-    for dep_name in noisy_deps:
-        logging.getLogger(dep_name).setLevel(deps_log_level)
+    for dep_logger in _NOISY_DEP_LOGGERS:
+        dep_logger.setLevel(deps_log_level)
 
-    # Get the main app logger for status messages
+    # Report the outcome with the main app logger, in a single record
     app_logger.info(
-        f"Logging configured. App level: {logging.getLevelName(app_log_level)}, "
-        f"Dependency level: {logging.getLevelName(deps_log_level)}"
+        "Logging configured for %s mode. App level: %s, Dependency level: %s",
+        actual_level_name,
+        logging.getLevelName(app_log_level),
+        logging.getLevelName(deps_log_level),
     )
-    if actual_level_name == "TRACE":
-        app_logger.info("TRACE mode: All dependencies are at DEBUG level.")
-    elif actual_level_name == "DEBUG":
-        app_logger.info("DEBUG mode: Application logs at DEBUG, dependencies at INFO.")
 
     return app_logger, access_logger, conversation_logger
+
+
+def configure_subprocess_logging(log_level: str = "INFO", **rich_options):
+    """
+    Configure logging for an MCP stdio subprocess.
+
+    Records go to stderr, since stdout carries the MCP protocol. The stream
+    is inherited from the parent, so Rich (configured with rich_options) is
+    used only when that is an interactive terminal.
+    """
+    root_logger = logging.getLogger()
+    while _owned_handlers:
+        root_logger.removeHandler(_owned_handlers.pop())
+
+    root_logger.setLevel(getattr(logging, log_level.upper(), logging.INFO))
+    handler = create_console_handler(sys.stderr, **rich_options)
+    root_logger.addHandler(handler)
+    _owned_handlers.append(handler)
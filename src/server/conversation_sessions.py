@@ -0,0 +1,327 @@
+"""
+Conversation session cache for the HTTP request handler.
+
+Conversation history is persisted by the agents SDK's SQLiteSession. This
+module keeps those session objects alive across requests so the per-session
+setup cost is paid once, off the event loop, and keeps each session's decoded
+history in memory. The database is shared with other servers and processes, so
+a cached history is checked against a cheap watermark query before use and is
+only reloaded and decoded when the stored conversation has changed. Those reads
+go through the cache's own connections; writes are left to the SDK.
+"""
+
+import asyncio
+import json
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import orjson
+from agents import SQLiteSession
+
+# Database used to persist conversation history between requests
+DEFAULT_DB_PATH = "data/http-llm-server.db"
+# Table the sessions store their items in; passed to the SDK so the cache's own
+# reads query the same one
+MESSAGES_TABLE = "agent_messages"
+# A run of digits that may be an integer outside the 64-bit range, which orjson
+# reads as a float where json.loads keeps it exact
+_WIDE_INT = re.compile(r"\d{19}")
+
+
+class _CountedSession(SQLiteSession):
+    """
+    A SQLiteSession that keeps its item count and history in memory.
+
+    Other servers and processes share the same database, so the cache is
+    checked against a watermark of the stored history (its item count and
+    highest row id) before it is used. That is one indexed query with no
+    decoding; the history is reloaded only when the watermark has moved.
+    Rows are decoded with orjson where it gives the same result as the SDK's
+    json.loads, and with json.loads otherwise.
+
+    item_count is None until the history has been counted successfully.
+    """
+
+    item_count: int | None = None
+    # Most recent items the model sees when no limit is requested; 0 for all
+    history_limit: int = 0
+    # Decoded history, or None until it has been read
+    _items: list | None = None
+    # Watermark of the stored history that _items matches
+    _watermark: tuple[int, int] | None = None
+    # Bumped by every write so a read that raced with one is not cached
+    _version: int = 0
+    # Connections used to read the history, owned by the cache
+    readers: "_ReadConnections"
+
+    async def refresh(self) -> list:
+        """Return the stored history, reloading it only if the database changed."""
+        items = self._items
+        known = self._watermark if items is not None else None
+        version = self._version
+        loaded, watermark = await asyncio.to_thread(
+            _load_items, self.readers, self.session_id, known
+        )
+        if loaded is not None:
+            items = loaded
+            if version == self._version:
+                self._items = items
+                self._watermark = watermark
+        if version == self._version:
+            self.item_count = watermark[0]
+        return items
+
+    async def get_items(self, limit: int | None = None):
+        items = await self.refresh()
+        if limit is not None:
+            return items[max(len(items) - limit, 0) :]
+        if self.history_limit and len(items) > self.history_limit:
+            return _recent_turns(items, self.history_limit)
+        return list(items)
+
+    async def add_items(self, items):
+        await super().add_items(items)
+        self._version += 1
+        version = self._version
+        watermark = await asyncio.to_thread(
+            _read_watermark, self.readers, self.session_id
+        )
+        if version != self._version:
+            # Another write through this instance finished in the meantime
+            return
+        cached = self._items
+        self._items = None
+        self.item_count = watermark[0]
+        if (
+            cached is not None
+            and self._watermark is not None
+            and watermark[0] == self._watermark[0] + len(items)
+        ):
+            # Cache what a read would return: the rows the SDK just wrote
+            cached.extend(_decode(json.dumps(item)) for item in items)
+            # Only this write happened since the cache was loaded
+            self._items = cached
+            self._watermark = watermark
+
+    async def pop_item(self):
+        item = await super().pop_item()
+        self._version += 1
+        # Rare; let the next read reload and recount
+        self._items = None
+        self.item_count = None
+        return item
+
+    async def clear_session(self):
+        await super().clear_session()
+        self._version += 1
+        self._items = None
+        self.item_count = 0
+
+
+class ConversationSessionCache:
+    """
+    A bounded LRU of SQLiteSession objects keyed by session ID.
+
+    Creating a file-backed SQLiteSession connects to the database and runs its
+    schema setup synchronously, and every instance opens its own per-thread
+    connections for reads and writes. Reusing instances avoids repeating that
+    work on each request, and the first construction for a session runs in a
+    worker thread so it never blocks the event loop.
+
+    Evicted sessions are dropped rather than closed, since a request may still
+    be using one; its connections are released once nothing references it.
+    """
+
+    def __init__(
+        self,
+        db_path: str = DEFAULT_DB_PATH,
+        max_sessions: int = 256,
+        history_limit: int = 0,
+    ):
+        self.db_path = db_path
+        self.max_sessions = max_sessions
+        self.history_limit = history_limit
+        self._sessions: OrderedDict[str, _CountedSession] = OrderedDict()
+        self._readers = _ReadConnections(db_path)
+
+    async def get_with_history_count(
+        self, session_id: str
+    ) -> tuple[SQLiteSession, int | None]:
+        """
+        Return the session for session_id and the number of items in its history.
+
+        The count is always read from the database, since other servers may
+        have written to the session; creating the session (on first use) and
+        counting its items share a single worker thread hop. The count is None
+        if the history could not be read.
+        """
+        session, count = await asyncio.to_thread(
+            self._open_and_count, session_id, self._sessions.get(session_id)
+        )
+        # A concurrent request may have created the session first
+        session = self._remember(session_id, session)
+        if count is not None:
+            session.item_count = count
+        return session, count
+
+    def _open_and_count(
+        self, session_id: str, session: _CountedSession | None
+    ) -> tuple[_CountedSession, int | None]:
+        if session is None:
+            session = _CountedSession(
+                session_id=session_id,
+                db_path=self.db_path,
+                messages_table=MESSAGES_TABLE,
+            )
+            session.readers = self._readers
+        try:
+            count = _count_items(self._readers, session_id)
+        except sqlite3.Error:
+            count = None
+        return session, count
+
+    def _remember(self, session_id: str, session: _CountedSession) -> _CountedSession:
+        session.history_limit = self.history_limit
+        # A concurrent request for the same session may have finished first
+        session = self._sessions.setdefault(session_id, session)
+        self._sessions.move_to_end(session_id)
+        if len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        return session
+
+    def close(self) -> None:
+        """
+        Drop the cached sessions and close the cache's read connections.
+
+        Call this only once no request is using the cache.
+        """
+        self._sessions.clear()
+        self._readers.close()
+
+
+class _ReadConnections:
+    """
+    Per-thread connections for reading session history.
+
+    sqlite3 connections must not be shared between threads that use them at
+    the same time, so each worker thread gets its own, opened on first use.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: list[sqlite3.Connection] = []
+
+    def get(self) -> sqlite3.Connection:
+        """Return the calling thread's connection, opening it if needed."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Closed from the event loop thread in close()
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self) -> None:
+        """Close the connections opened in every thread."""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        self._local = threading.local()
+        for conn in connections:
+            conn.close()
+
+
+def _count_items(readers: _ReadConnections, session_id: str) -> int:
+    """Count a session's stored items without loading them (worker thread only)."""
+    conn = readers.get()
+    row = conn.execute(
+        f"SELECT COUNT(*) FROM {MESSAGES_TABLE} WHERE session_id = ?",
+        (session_id,),
+    ).fetchone()
+    return row[0] if row else 0
+
+
+def _read_watermark(readers: _ReadConnections, session_id: str) -> tuple[int, int]:
+    """Return a session's stored item count and highest row id (worker thread only)."""
+    conn = readers.get()
+    count, max_id = conn.execute(
+        f"SELECT COUNT(*), COALESCE(MAX(id), 0) FROM {MESSAGES_TABLE} "
+        "WHERE session_id = ?",
+        (session_id,),
+    ).fetchone()
+    return count, max_id
+
+
+def _load_items(
+    readers: _ReadConnections, session_id: str, known: tuple[int, int] | None
+) -> tuple[list | None, tuple[int, int]]:
+    """
+    Load a session's stored items, oldest first (worker thread only).
+
+    If known is the current watermark the items are not read, and None is
+    returned in their place. Otherwise the watermark is taken from the rows
+    that were read, so the two always describe the same snapshot.
+    """
+    if known is not None:
+        watermark = _read_watermark(readers, session_id)
+        if watermark == known:
+            return None, watermark
+
+    # Same query and ordering as SQLiteSession.get_items
+    conn = readers.get()
+    rows = conn.execute(
+        f"SELECT id, message_data FROM {MESSAGES_TABLE} "
+        "WHERE session_id = ? ORDER BY created_at ASC",
+        (session_id,),
+    ).fetchall()
+
+    items = []
+    max_id = 0
+    for row_id, message_data in rows:
+        if row_id > max_id:
+            max_id = row_id
+        try:
+            items.append(_decode(message_data))
+        except json.JSONDecodeError:
+            # The SDK skips rows it cannot decode as well
+            continue
+    return items, (len(rows), max_id)
+
+
+def _decode(message_data: str):
+    """Decode a stored item exactly as the SDK's json.loads would."""
+    if _WIDE_INT.search(message_data) is None:
+        try:
+            return orjson.loads(message_data)
+        except orjson.JSONDecodeError:
+            # NaN, Infinity and lone surrogates, which json.loads accepts
+            pass
+    return json.loads(message_data)
+
+
+def _recent_turns(items: list, limit: int) -> list:
+    """
+    Drop the oldest whole turns, keeping the history from a user message on.
+
+    The cut is made at the first user message among the last limit items, so
+    the result is usually shorter than limit and never splits a turn (a tool
+    call always stays with its output). If those items hold no user message,
+    the cut moves back to the latest earlier one and the result exceeds limit;
+    with no user message at all, nothing is dropped.
+    """
+    start = len(items) - limit
+    for i in range(start, len(items)):
+        if _is_user_message(items[i]):
+            return items[i:]
+    for i in range(start - 1, -1, -1):
+        if _is_user_message(items[i]):
+            return items[i:]
+    return list(items)
+
+
+def _is_user_message(item) -> bool:
+    return isinstance(item, dict) and item.get("role") == "user"
@@ -26,16 +26,23 @@ import asyncio
 import logging
 import os
 import re
-import sys
 import uuid
 from datetime import datetime
 
-import jinja2
 import yaml
 from mcp.server.fastmcp.server import Context, FastMCP
 from mcp.types import TextContent
-from rich.console import Console
-from rich.logging import RichHandler
+
+from src.config import Config
+from src.logging_config import configure_subprocess_logging
+from src.server.jinja_env import compile_template
+
+# uvloop is optional (the "uvloop" extra); when installed it runs the event
+# loop serving the web servers' streaming connections
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
 
 # Note: WebServer is imported lazily inside functions to prevent
 # module-level configure_logging from writing to stdout before
@@ -45,35 +52,6 @@ from rich.logging import RichHandler
 logger = logging.getLogger("llm_http_server_app")
 
 
-def configure_subprocess_logging(log_level: str = "INFO"):
-    """Configure consistent logging for subprocess visibility."""
-    # Import the filter from the main logging configuration
-    from src.logging_config import SingleLineExtrasFilter
-
-    # Get the root logger
-    root_logger = logging.getLogger()
-    if not root_logger.handlers:
-        root_logger.setLevel(log_level)
-    else:
-        # Clear existing handlers to avoid duplicate logs
-        root_logger.handlers.clear()
-
-    # Create console that explicitly writes to stderr (not stdout, to avoid MCP
-    # protocol interference)
-    console = Console(file=sys.stderr, force_terminal=True)
-
-    # Add RichHandler with same configuration as main process, but with explicit
-    # stderr console
-    rich_handler = RichHandler(
-        console=console,
-        rich_tracebacks=True,
-        tracebacks_show_locals=True,
-        show_path=False,
-    )
-    rich_handler.addFilter(SingleLineExtrasFilter())
-    root_logger.addHandler(rich_handler)
-
-
 # In-memory store for our web server resources
 web_servers: dict[str, dict] = {}
 
@@ -239,37 +217,48 @@ async def setup_web_application(
         with open(web_app_file, "r") as f:
             content = f.read()
 
-        web_app_dir = os.path.dirname(os.path.abspath(web_app_file))
-        project_root = os.path.abspath(
-            os.path.join(os.path.dirname(__file__), "..", "..")
-        )
+        if "{{" not in content and "{%" not in content:
+            # Nothing to render: share the cached parse that the WebServer's
+            # Config will reuse instead of YAML-parsing the file twice
+            additional_servers = Config.parse_web_app_file(web_app_file)
+            if additional_servers:
+                logger.debug(
+                    f"Found {len(additional_servers)} additional MCP "
+                    "servers in web app file"
+                )
+                mcp_servers.extend(additional_servers)
+        else:
+            web_app_dir = os.path.dirname(os.path.abspath(web_app_file))
+            project_root = os.path.abspath(
+                os.path.join(os.path.dirname(__file__), "..", "..")
+            )
 
-        template = jinja2.Template(content)
-        rendered_content = template.render(
-            WEB_APP_DIR=web_app_dir, project_root=project_root
-        )
+            template = compile_template(content)
+            rendered_content = template.render(
+                WEB_APP_DIR=web_app_dir, project_root=project_root
+            )
 
-        logger.debug(
-            f"Web app file content starts with: {rendered_content[:100]}..."
-        )
-        if rendered_content.startswith("---"):
-            parts = rendered_content.split("---", 2)
-            if len(parts) > 2:
-                front_matter_str = parts[1]
-                front_matter = yaml.safe_load(front_matter_str)
-                if "mcp_servers" in front_matter:
-                    additional_servers = front_matter["mcp_servers"]
-                    if isinstance(additional_servers, list):
-                        logger.debug(
-                            f"Found {len(additional_servers)} additional MCP "
-                            "servers in web app file"
-                        )
-                        mcp_servers.extend(additional_servers)
-                    else:
-                        logger.warning(
-                            "mcp_servers in YAML front matter is not a list, "
-                            "skipping"
-                        )
+            logger.debug(
+                f"Web app file content starts with: {rendered_content[:100]}..."
+            )
+            if rendered_content.startswith("---"):
+                parts = rendered_content.split("---", 2)
+                if len(parts) > 2:
+                    front_matter_str = parts[1]
+                    front_matter = yaml.safe_load(front_matter_str)
+                    if "mcp_servers" in front_matter:
+                        additional_servers = front_matter["mcp_servers"]
+                        if isinstance(additional_servers, list):
+                            logger.debug(
+                                f"Found {len(additional_servers)} additional MCP "
+                                "servers in web app file"
+                            )
+                            mcp_servers.extend(additional_servers)
+                        else:
+                            logger.warning(
+                                "mcp_servers in YAML front matter is not a list, "
+                                "skipping"
+                            )
 
         # Now, create and start the web resource with the collected MCP servers
         create_result = await create_web_resource(
@@ -307,53 +296,60 @@ async def setup_web_application(
 
 
 @core_services.tool()
-async def list_web_resources(context: Context) -> TextContent:
-    """Lists all created web server resources and their status."""
+async def list_web_resources(
+    context: Context, limit: int = 0, after: str = ""
+) -> TextContent:
+    """
+    Lists created web server resources and their status.
+
+    Args:
+        limit: Maximum number of resources to list; 0 lists all of them
+        after: Resume the listing after the resource with this ID
+    """
+    if after and after not in web_servers:
+        return TextContent(
+            type="text",
+            text=f"Error: unknown resource ID {after!r} for after; "
+            "pass an ID from a previous listing.",
+        )
     if not web_servers:
         return TextContent(type="text", text="No web server resources found.")
 
-    resource_list = [
-        {
-            "id": data["id"],
-            "status": data["status"],
-            "host": data["host"],
-            "port": data["port"],
-            "mcp_servers": data["mcp_servers"],
-            "created": data["created"],
-            "started": data.get("started"),
-            "stopped": data.get("stopped"),
-            "error": data.get("error"),
-        }
-        for data in web_servers.values()
-    ]
-
-    result = f"Found {len(web_servers)} web server resource(s):\n"
-    for resource in resource_list:
-        result += (
-            f"  - {resource['id']}: {resource['status']} on "
-            f"{resource['host']}:{resource['port']}\n"
+    # web_servers keeps creation order, so resume just past `after`
+    remaining = list(web_servers.values())
+    if after:
+        remaining = remaining[list(web_servers).index(after) + 1 :]
+    page = remaining[:limit] if limit > 0 else remaining
+
+    lines = [f"Found {len(web_servers)} web server resource(s):"]
+    for data in page:
+        lines.append(
+            f"  - {data['id']}: {data['status']} on {data['host']}:{data['port']}"
+        )
+        lines.append(
+            f"    MCP servers: {data['mcp_servers']}, Created: {data['created']}"
         )
-        result += (
-            f"    MCP servers: {resource['mcp_servers']}, "
-            f"Created: {resource['created']}\n"
+        lines.append(f"    Started: {data.get('started')}")
+        lines.append(f"    Stopped: {data.get('stopped')}")
+        lines.append(f"    Error: {data.get('error')}")
+    if len(page) < len(remaining):
+        lines.append(
+            f"More resources available; pass after={page[-1]['id']} to continue."
         )
-        if "started" in resource:
-            result += f"    Started: {resource['started']}\n"
-        if "stopped" in resource:
-            result += f"    Stopped: {resource['stopped']}\n"
-        if "error" in resource:
-            result += f"    Error: {resource['error']}\n"
 
-    return TextContent(type="text", text=result)
+    lines.append("")
+    return TextContent(type="text", text="\n".join(lines))
 
 
 async def main():
     """Main function to run the core services server."""
     log_level = os.environ.get("CORE_SERVICES_LOG_LEVEL", "INFO")
-    configure_subprocess_logging(log_level)
+    configure_subprocess_logging(
+        log_level, rich_tracebacks=True, tracebacks_show_locals=True, show_path=False
+    )
     logger.info("Starting core services MCP server via stdio")
     await core_services.run_stdio_async()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    asyncio.run(main(), loop_factory=uvloop.new_event_loop if uvloop else None)
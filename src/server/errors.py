@@ -118,8 +118,8 @@ async def send_llm_error_response_aiohttp(
                     status_code, message, error_details
                 )
 
-            separator = "\r\n\r\n"
-            if separator not in response_text:
+            header_text, separator, body = response_text.partition("\r\n\r\n")
+            if not separator:
                 app_logger.error(
                     "LLM-generated error page response is missing header-body "
                     "separator. Falling back."
@@ -128,11 +128,10 @@ async def send_llm_error_response_aiohttp(
                     status_code, message, error_details
                 )
 
-            header_text, body = response_text.split(separator, 1)
             response = web.Response(status=status_code, body=body)
             for line in header_text.split("\r\n"):
-                if ":" in line:
-                    key, value = line.split(":", 1)
+                key, colon, value = line.partition(":")
+                if colon:
                     response.headers[key.strip()] = value.strip()
 
             app_logger.info(f"Successfully generated LLM error page for {status_code}")
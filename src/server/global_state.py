@@ -0,0 +1,69 @@
+"""
+Application-wide state shared with the system prompt.
+
+The request handler embeds the global state in every system prompt as JSON.
+The state changes far less often than requests arrive, so the serialized form
+is cached and only rebuilt after the dict is modified.
+"""
+
+import orjson
+
+
+class VersionedState(dict):
+    """
+    A dict that counts its own modifications and caches its JSON form.
+
+    Only top-level changes bump the version; replace a nested value rather
+    than mutating it in place so the cached JSON is refreshed.
+    """
+
+    __slots__ = ("version", "_json", "_json_version")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.version = 0
+        self._json = ""
+        self._json_version = -1
+
+    def as_json(self) -> str:
+        """Return the state as indented JSON, serializing only after changes."""
+        if self._json_version != self.version:
+            self._json = orjson.dumps(self, option=orjson.OPT_INDENT_2).decode()
+            self._json_version = self.version
+        return self._json
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.version += 1
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.version += 1
+
+    def __ior__(self, other):
+        result = super().__ior__(other)
+        self.version += 1
+        return result
+
+    def clear(self):
+        super().clear()
+        self.version += 1
+
+    def pop(self, *args):
+        result = super().pop(*args)
+        self.version += 1
+        return result
+
+    def popitem(self):
+        result = super().popitem()
+        self.version += 1
+        return result
+
+    def setdefault(self, key, default=None):
+        result = super().setdefault(key, default)
+        self.version += 1
+        return result
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self.version += 1
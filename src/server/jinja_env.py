@@ -0,0 +1,24 @@
+"""
+Shared Jinja2 environment for every template the server renders.
+
+System prompts, web app rules, error prompts and web app files are all
+compiled against this one environment, so its configuration and compiled
+template cache are shared instead of being rebuilt per template.
+"""
+
+import functools
+
+import jinja2
+
+# Prompts are plain text, so autoescaping is left off to match the semantics
+# of a bare jinja2.Template.
+jinja_env = jinja2.Environment(
+    loader=jinja2.FileSystemLoader("."),
+    autoescape=False,
+)
+
+
+@functools.lru_cache(maxsize=32)
+def compile_template(source: str) -> jinja2.Template:
+    """Compile a template against the shared environment, once per source."""
+    return jinja_env.from_string(source)
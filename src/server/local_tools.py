@@ -50,8 +50,8 @@ The DSPy integration uses environment variables passed from the parent process:
 import asyncio
 import logging
 import os
+import secrets
 import sys
-import uuid
 from collections.abc import AsyncIterator
 from contextlib import asynccontextmanager
 
@@ -61,20 +61,83 @@ from mcp.server.fastmcp.server import Context
 from mcp.server.fastmcp.server import FastMCP as Server
 from mcp.types import CallToolResult, TextContent
 
+from src.logging_config import configure_subprocess_logging
+
+logger = logging.getLogger("llm_http_server_app")
+
+# download_file reads and writes in chunks of this size. aiofiles runs each
+# write in a worker thread, so large chunks keep the number of thread hops
+# and write syscalls low for big downloads.
+_DOWNLOAD_CHUNK_SIZE = 1 << 20
+
 # A server instance is created globally, and tools are registered against it.
 local_mcp_server = Server(
     name="local-tools-server",
 )
 
+_DOWNLOAD_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (compatible; http-llm-server/1.0)",
+    "Accept": "*/*",
+    "Accept-Encoding": "gzip, deflate",
+    "Connection": "keep-alive",
+}
+_DOWNLOAD_TIMEOUT = aiohttp.ClientTimeout(total=600, connect=30, sock_read=300)
+
+# Key-value store behind set_global_state/get_global_state. The tools run as
+# coroutines on the server's event loop and touch it with a single dict
+# operation each, so it needs no lock. A tool that ever does a
+# read-modify-write across an await should take an asyncio.Lock for it,
+# never a threading.Lock.
+_global_state: dict[str, str] = {}
+
+# Shared by every download_file call so repeat downloads reuse pooled
+# keep-alive connections and cached DNS lookups
+_http_session: aiohttp.ClientSession | None = None
+
+
+def _get_http_session() -> aiohttp.ClientSession:
+    """Return the shared download session, creating it on first use."""
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit_per_host=5, ttl_dns_cache=300),
+            timeout=_DOWNLOAD_TIMEOUT,
+            headers=_DOWNLOAD_HEADERS,
+        )
+    return _http_session
+
+
+def _text_result(text: str) -> CallToolResult:
+    """
+    Wrap a string built by these tools in a tool result.
+
+    The content is known to be well formed, so model_construct() is used to
+    skip the pydantic validation CallToolResult(...) and TextContent(...) run.
+    """
+    return CallToolResult.model_construct(
+        content=[TextContent.model_construct(type="text", text=text)]
+    )
+
+
+# Returned by generate_http_response when the DSPy program is unavailable or
+# fails. The text never changes, so the result is built once and shared.
+_FALLBACK_HTTP_RESPONSE = (
+    "HTTP/1.1 200 OK\r\n"
+    "Content-Type: text/plain; charset=utf-8\r\n"
+    "\r\n"
+    "Hello, world!"
+)
+_FALLBACK_RESULT = _text_result(_FALLBACK_HTTP_RESPONSE)
+
 
 @local_mcp_server.tool()
 async def create_session(context: Context) -> CallToolResult:
     """
     Creates a new, unique session identifier.
     """
-    new_id = str(uuid.uuid4())
-    logging.info(f"Local tool created new session: {new_id}")
-    return CallToolResult(content=[TextContent(type="text", text=new_id)])
+    new_id = secrets.token_hex(16)
+    logger.info("Local tool created new session: %s", new_id)
+    return _text_result(new_id)
 
 
 @local_mcp_server.tool()
@@ -82,12 +145,9 @@ async def set_global_state(context: Context, key: str, value: str) -> CallToolRe
     """
     Stores a string value in a global, server-side dictionary.
     """
-    global_state = local_mcp_server.global_state
-    global_state[key] = value
-    logging.info(f"Local tool set global state: {key} = {value}")
-    return CallToolResult(
-        content=[TextContent(type="text", text=f"Value for '{key}' has been set.")]
-    )
+    _global_state[key] = value
+    logger.info("Local tool set global state: %s = %s", key, value)
+    return _text_result(f"Value for '{key}' has been set.")
 
 
 @local_mcp_server.tool()
@@ -95,10 +155,9 @@ async def get_global_state(context: Context, key: str) -> CallToolResult:
     """
     Retrieves a string value from the global, server-side dictionary.
     """
-    global_state = local_mcp_server.global_state
-    value = global_state.get(key, "")
-    logging.info(f"Local tool retrieved global state: {key} -> {value}")
-    return CallToolResult(content=[TextContent(type="text", text=value)])
+    value = _global_state.get(key, "")
+    logger.info("Local tool retrieved global state: %s -> %s", key, value)
+    return _text_result(value)
 
 
 @local_mcp_server.tool()
@@ -114,75 +173,60 @@ async def download_file(
         destination: Local file path to save to
         max_retries: Maximum number of retry attempts (default: 3)
     """
-    logging.info(
-        f"START: url={url}, destination={destination}, max_retries={max_retries}"
+    logger.info(
+        "START: url=%s, destination=%s, max_retries=%s", url, destination, max_retries
     )
 
     destination_dir = os.path.dirname(destination)
     if destination_dir:
         os.makedirs(destination_dir, exist_ok=True)
-        logging.debug(f"Ensured directory exists: {destination_dir}")
-
-    headers = {
-        "User-Agent": "Mozilla/5.0 (compatible; http-llm-server/1.0)",
-        "Accept": "*/*",
-        "Accept-Encoding": "gzip, deflate",
-        "Connection": "keep-alive",
-    }
+        logger.debug("Ensured directory exists: %s", destination_dir)
 
-    connector = aiohttp.TCPConnector(limit_per_host=5)
-    timeout = aiohttp.ClientTimeout(total=600, connect=30, sock_read=300)
+    session = _get_http_session()
     last_exception = None
 
     for attempt in range(max_retries + 1):
         if attempt > 0:
             wait_time = min(2**attempt, 30)  # Exponential backoff
-            logging.info(
-                f"Retry attempt {attempt}/{max_retries} after {wait_time}s delay"
+            logger.info(
+                "Retry attempt %d/%d after %ds delay", attempt, max_retries, wait_time
             )
             await asyncio.sleep(wait_time)
 
         try:
-            async with aiohttp.ClientSession(
-                connector=connector, timeout=timeout, headers=headers
-            ) as session:
-                async with session.get(url, allow_redirects=True) as response:
-                    response.raise_for_status()
-
-                    content_length = response.headers.get("Content-Length")
-                    logging.info(
-                        f"Downloading from {response.url} "
-                        f"({response.status}, {content_length} bytes)"
-                    )
-
-                    total_bytes = 0
-                    async with aiofiles.open(destination, "wb") as f:
-                        async for chunk in response.content.iter_chunked(8192):
-                            await f.write(chunk)
-                            total_bytes += len(chunk)
-
-                    logging.info(
-                        "Download successful: %d bytes written to %s",
-                        total_bytes,
-                        destination,
-                    )
-                    return CallToolResult(
-                        content=[
-                            TextContent(
-                                type="text",
-                                text=(
-                                    f"File downloaded to {destination} "
-                                    f"({total_bytes:,} bytes)"
-                                ),
-                            )
-                        ]
-                    )
+            async with session.get(url, allow_redirects=True) as response:
+                response.raise_for_status()
+
+                content_length = response.headers.get("Content-Length")
+                logger.info(
+                    "Downloading from %s (%s, %s bytes)",
+                    response.url,
+                    response.status,
+                    content_length,
+                )
+
+                total_bytes = 0
+                async with aiofiles.open(destination, "wb") as f:
+                    async for chunk in response.content.iter_chunked(
+                        _DOWNLOAD_CHUNK_SIZE
+                    ):
+                        await f.write(chunk)
+                        total_bytes += len(chunk)
+
+                logger.info(
+                    "Download successful: %d bytes written to %s",
+                    total_bytes,
+                    destination,
+                )
+                return _text_result(
+                    f"File downloaded to {destination} ({total_bytes:,} bytes)"
+                )
 
         except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
             last_exception = e
-            logging.warning(f"Download attempt {attempt + 1} failed: {e}")
+            logger.warning("Download attempt %d failed: %s", attempt + 1, e)
             if attempt == max_retries:
-                logging.error("Final download attempt failed.")
+                logger.error("Final download attempt failed.")
                 break
             continue
 
@@ -205,11 +249,11 @@ async def generate_http_response(
     """
     import os
     import dspy
-    from src.dspy_module import HttpProgram
+    from src.dspy_module import load_compiled_program
     
-    logging.info("generate_http_response tool called!")
-    logging.info(f"context_str: {context_str}")
-    logging.info(f"http_request: {http_request}")
+    logger.info("generate_http_response tool called!")
+    logger.info("context_str: %s", context_str)
+    logger.info("http_request: %s", http_request)
     
     # Configure DSPy with LM from environment variables
     # This is required because the subprocess doesn't inherit the in-memory configuration
@@ -222,50 +266,40 @@ async def generate_http_response(
         if base_url:
             lm_config["api_base"] = base_url
         dspy.configure(lm=dspy.LM(f"openai/{model_name}", **lm_config))
-        logging.info(f"Configured DSPy with model: openai/{model_name}")
+        logger.info("Configured DSPy with model: openai/%s", model_name)
     else:
-        logging.warning("No OPENAI_API_KEY found, DSPy will use default configuration")
+        logger.warning("No OPENAI_API_KEY found, DSPy will use default configuration")
     
     # Try to load the compiled DSPy program from file
     # The program is saved by web_resource.py after compilation
     compiled_program = None
     dspy_program_path = os.path.join(os.getcwd(), "data", ".dspy_cache", "http_program.json")
     
-    if os.path.exists(dspy_program_path):
-        try:
-            compiled_program = HttpProgram()
-            compiled_program.load(dspy_program_path)
-            logging.info(f"Loaded compiled DSPy program from {dspy_program_path}")
-        except Exception as e:
-            logging.error(f"Failed to load DSPy program: {e}")
-            compiled_program = None
-    else:
-        logging.info(f"No compiled DSPy program found at {dspy_program_path}")
+    try:
+        compiled_program = load_compiled_program(dspy_program_path)
+        logger.info("Loaded compiled DSPy program from %s", dspy_program_path)
+    except FileNotFoundError:
+        logger.info("No compiled DSPy program found at %s", dspy_program_path)
+    except Exception as e:
+        logger.error("Failed to load DSPy program: %s", e)
+        compiled_program = None
     
     if compiled_program:
         try:
             # Use the compiled DSPy program with parameter names matching signature
             result = compiled_program(context=context_str, http_request=http_request)
             http_response = result.http_response
-            logging.info(f"DSPy generated response: {http_response}")
+            logger.info("DSPy generated response: %s", http_response)
             return CallToolResult(
                 content=[TextContent(type="text", text=http_response)]
             )
         except Exception as e:
-            logging.error(f"Error running DSPy program: {e}")
+            logger.error("Error running DSPy program: %s", e)
             # Fall through to fallback
     
     # Fallback response if DSPy program is not available or failed
-    fallback_response = (
-        "HTTP/1.1 200 OK\r\n"
-        "Content-Type: text/plain; charset=utf-8\r\n"
-        "\r\n"
-        "Hello, world!"
-    )
-    logging.info(f"Using fallback response: {fallback_response}")
-    return CallToolResult(
-        content=[TextContent(type="text", text=fallback_response)]
-    )
+    logger.info("Using fallback response: %s", _FALLBACK_HTTP_RESPONSE)
+    return _FALLBACK_RESULT
 
 def create_local_tools_stdio_server(
     global_state: dict,
@@ -274,6 +308,8 @@ def create_local_tools_stdio_server(
     Creates the StdioServer application for the local tools with separate MCP
     session store.
     """
+    global _global_state
+    _global_state = global_state
     local_mcp_server.global_state = global_state
 
     @asynccontextmanager
@@ -289,30 +325,24 @@ def create_local_tools_stdio_server(
 async def main():
     """Main function to run the MCP server with stdio transport."""
     # MCP stdio transport uses stdout for JSONRPC - logging MUST go to stderr
-    import sys
     log_level = os.environ.get("LOCAL_TOOLS_LOG_LEVEL", "INFO")
-    
-    # Configure basic logging to stderr (not stdout) to avoid corrupting JSONRPC
-    handler = logging.StreamHandler(sys.stderr)
-    handler.setFormatter(logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    ))
-    logging.root.handlers.clear()
-    logging.root.addHandler(handler)
-    logging.root.setLevel(getattr(logging, log_level.upper(), logging.INFO))
+    configure_subprocess_logging(log_level, rich_tracebacks=True, show_path=False)
 
-    logging.info("Starting local tools MCP server")
+    logger.info("Starting local tools MCP server")
 
     try:
         # The tool implementations are registered with `local_mcp_server`
         # Now, we just need to run the server.
         # Initialize with empty global state and session store for standalone execution
         server = create_local_tools_stdio_server({})
-        logging.debug("Local tools initialized, starting stdio server")
+        logger.debug("Local tools initialized, starting stdio server")
         await server.run_stdio_async()
     except Exception as e:
-        logging.error(f"Local tools failed to run: {e}", exc_info=True)
+        logger.error(f"Local tools failed to run: {e}", exc_info=True)
         sys.exit(1)
+    finally:
+        if _http_session is not None:
+            await _http_session.close()
 
 
 if __name__ == "__main__":
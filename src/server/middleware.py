@@ -29,6 +29,7 @@ This module provides middlewares for:
 - Error handling (LLM-generated error responses)
 """
 
+import logging
 import time
 from typing import Awaitable, Callable
 
@@ -41,6 +42,29 @@ from .errors import send_llm_error_response_aiohttp
 app_logger, access_logger, _ = get_loggers()
 
 EMPTY_RESPONSE_STREAMED = "[LLM_EMPTY_RESPONSE_STREAMED]"
+SESSION_COOKIE_NAME = "session_id"
+
+
+def _extract_cookie(cookie_header: str, name: str) -> str | None:
+    """
+    Return the raw value of one cookie from a Cookie header, or None.
+
+    Scans for the single cookie the server needs instead of parsing every
+    cookie in the header into a SimpleCookie. Quoted values keep their quotes.
+    """
+    needle = name + "="
+    start = cookie_header.find(needle)
+    # Skip matches that are the tail of a longer cookie name
+    while start > 0 and cookie_header[start - 1] not in " ;":
+        start = cookie_header.find(needle, start + 1)
+    if start == -1:
+        return None
+    start += len(needle)
+    end = cookie_header.find(";", start)
+    if end == -1:
+        end = len(cookie_header)
+    value = cookie_header[start:end].strip()
+    return value or None
 
 
 def logging_and_metrics_middleware():
@@ -58,20 +82,21 @@ def logging_and_metrics_middleware():
         request: web.Request,
         handler: Callable[[web.Request], Awaitable[web.StreamResponse]],
     ) -> web.StreamResponse:
-        start_time = time.perf_counter()
-        client_address_str = f"{request.remote}"
+        start_ns = time.monotonic_ns()
+        # Resolved once per request; later stages read it from the request
+        client_address_str = request.remote or "Unknown Client"
         request["client_address_str"] = client_address_str
         access_logger.info(
-            f"[{client_address_str}] Incoming: {request.method} {request.path_qs}"
+            "[%s] Incoming: %s %s", client_address_str, request.method, request.path_qs
         )
 
         try:
             response = await handler(request)
 
             # Extract metrics from request context (set by handler or other middleware)
-            llm_first_token_time = request.get("llm_first_token_time")
-            llm_stream_end_time = request.get("llm_stream_end_time")
-            llm_call_start_time = request.get("llm_call_start_time")
+            llm_first_token_ns = request.get("llm_first_token_ns")
+            llm_stream_end_ns = request.get("llm_stream_end_ns")
+            llm_call_start_ns = request.get("llm_call_start_ns")
             llm_response_fully_collected_text_for_log = request.get(
                 "llm_response_fully_collected_text_for_log", ""
             )
@@ -86,41 +111,42 @@ def logging_and_metrics_middleware():
             final_session_id_for_turn = request.get("final_session_id_for_turn")
             session_id_from_cookie = request.get("session_id_from_cookie")
 
-            # Calculate performance metrics
-            end_time = time.perf_counter()
-            duration = end_time - start_time
+            # Calculate performance metrics from integer nanosecond timestamps,
+            # converting to seconds once per value
+            duration = (time.monotonic_ns() - start_ns) / 1e9
             ttft_str = "N/A"
             duration_llm_stream_str = "N/A"
 
             llm_ttft_seconds_val = None
-            if llm_call_start_time and llm_first_token_time:
-                ttft_calc = llm_first_token_time - llm_call_start_time
-                if ttft_calc >= 0:
-                    llm_ttft_seconds_val = ttft_calc
+            if llm_call_start_ns and llm_first_token_ns:
+                ttft_ns = llm_first_token_ns - llm_call_start_ns
+                if ttft_ns >= 0:
+                    llm_ttft_seconds_val = ttft_ns / 1e9
                     ttft_str = f"{llm_ttft_seconds_val:.3f}s"
 
+            llm_stream_duration_ns = None
             llm_stream_duration_seconds_val = None
-            if llm_call_start_time and llm_stream_end_time:
-                duration_llm_calc = llm_stream_end_time - llm_call_start_time
-                if duration_llm_calc >= 0:
-                    llm_stream_duration_seconds_val = duration_llm_calc
+            if llm_call_start_ns and llm_stream_end_ns:
+                stream_ns = llm_stream_end_ns - llm_call_start_ns
+                if stream_ns >= 0:
+                    llm_stream_duration_ns = stream_ns
+                    llm_stream_duration_seconds_val = stream_ns / 1e9
                     duration_llm_stream_str = f"{llm_stream_duration_seconds_val:.3f}s"
 
             compl_tokens_per_sec_str = "N/A"
             compl_tokens_per_sec_val = None
-            if llm_stream_duration_seconds_val is not None:
-                if llm_stream_duration_seconds_val > 0:
+            if llm_stream_duration_ns is not None:
+                if llm_stream_duration_ns > 0:
                     if completion_tokens_from_usage > 0:
                         tokens_per_sec = (
-                            completion_tokens_from_usage
-                            / llm_stream_duration_seconds_val
+                            completion_tokens_from_usage * 1e9 / llm_stream_duration_ns
                         )
                         compl_tokens_per_sec_str = f"{tokens_per_sec:.2f}"
                         compl_tokens_per_sec_val = tokens_per_sec
                     else:
                         compl_tokens_per_sec_str = "0.00 (no tokens)"
                         compl_tokens_per_sec_val = 0.0
-                elif llm_stream_duration_seconds_val == 0:
+                else:
                     if completion_tokens_from_usage > 0:
                         compl_tokens_per_sec_str = "Infinity"
                         compl_tokens_per_sec_val = float("inf")
@@ -129,21 +155,23 @@ def logging_and_metrics_middleware():
                         compl_tokens_per_sec_val = 0.0
 
             # Debug timing and response characteristics
-            app_logger.debug(
-                f"[{client_address_str}] Request processing complete",
-                extra={
-                    "total_duration": f"{duration:.3f}s",
-                    "llm_ttft": ttft_str,
-                    "llm_stream_duration": duration_llm_stream_str,
-                    "tokens_per_second": compl_tokens_per_sec_str,
-                    "response_size_chars": len(
-                        llm_response_fully_collected_text_for_log or ""
-                    ),
-                    "session_id": final_session_id_for_turn or "none",
-                    "had_errors": bool(model_error_indicator_for_recording),
-                    "finish_reason": last_chunk_finish_reason or "none",
-                },
-            )
+            if app_logger.isEnabledFor(logging.DEBUG):
+                app_logger.debug(
+                    "[%s] Request processing complete",
+                    client_address_str,
+                    extra={
+                        "total_duration": f"{duration:.3f}s",
+                        "llm_ttft": ttft_str,
+                        "llm_stream_duration": duration_llm_stream_str,
+                        "tokens_per_second": compl_tokens_per_sec_str,
+                        "response_size_chars": len(
+                            llm_response_fully_collected_text_for_log or ""
+                        ),
+                        "session_id": final_session_id_for_turn or "none",
+                        "had_errors": bool(model_error_indicator_for_recording),
+                        "finish_reason": last_chunk_finish_reason or "none",
+                    },
+                )
 
             access_log_extra = {
                 "remote_address": client_address_str,
@@ -170,13 +198,9 @@ def logging_and_metrics_middleware():
                 "llm_finish_reason": last_chunk_finish_reason,
             }
 
-            log_msg_final = (
-                f"[{client_address_str}] {request.method} {request.path_qs} - "
-                f"{response.status}"
-            )
-
+            error_marker = ""
             if model_error_indicator_for_recording:
-                log_msg_final += " [MODEL_ERROR]"
+                error_marker = " [MODEL_ERROR]"
                 access_log_extra["error_indicator"] = (
                     model_error_indicator_for_recording
                 )
@@ -184,7 +208,16 @@ def logging_and_metrics_middleware():
                     llm_response_fully_collected_text_for_log
                 )
 
-            access_logger.info(log_msg_final, extra=access_log_extra)
+            # Formatted only if a handler actually emits the record
+            access_logger.info(
+                "[%s] %s %s - %s%s",
+                client_address_str,
+                request.method,
+                request.path_qs,
+                response.status,
+                error_marker,
+                extra=access_log_extra,
+            )
 
             return response
         except Exception as e:
@@ -220,17 +253,21 @@ def session_middleware():
         request: web.Request,
         handler: Callable[[web.Request], Awaitable[web.StreamResponse]],
     ) -> web.StreamResponse:
-        client_address_str = request.get("client_address_str", "Unknown Client")
-
-        # Use the built-in cookie parsing from aiohttp, which is more robust
-        # than manual string splitting.
-        session_id_from_cookie = request.cookies.get("session_id")
+        # Pull just the session cookie out of the header; aiohttp's
+        # request.cookies is only consulted for quoted values
+        session_id_from_cookie = _extract_cookie(
+            request.headers.get("Cookie", ""), SESSION_COOKIE_NAME
+        )
+        if session_id_from_cookie is not None and session_id_from_cookie[:1] == '"':
+            session_id_from_cookie = request.cookies.get(SESSION_COOKIE_NAME)
 
-        if session_id_from_cookie:
+        if session_id_from_cookie and app_logger.isEnabledFor(logging.DEBUG):
             app_logger.debug(
                 "Existing session ID found in cookie",
                 extra={
-                    "client_address": client_address_str,
+                    "client_address": request.get(
+                        "client_address_str", "Unknown Client"
+                    ),
                     "session_id": session_id_from_cookie,
                 },
             )
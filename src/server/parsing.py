@@ -5,6 +5,7 @@ This module contains stateless helper functions for parsing web app files
 and constructing raw HTTP requests.
 """
 
+import asyncio
 import re
 
 import yaml
@@ -18,6 +19,13 @@ app_logger, _, _ = get_loggers()
 # Default web app file path
 DEFAULT_WEB_APP_FILE = "examples/default_info_site/prompt.md"
 
+# aiohttp's default client_max_size, which the web server does not override.
+# Larger bodies go through request.read() so it can enforce the limit.
+_MAX_PRESIZED_BODY = 1024**2
+
+# YAML front matter delimited by "---" lines, followed by the markdown body
+_FRONT_MATTER_RE = re.compile(r"^---\n(.*?)\n---\n(.*)$", re.DOTALL)
+
 
 def parse_webapp_file(file_path):
     """
@@ -29,11 +37,15 @@ def parse_webapp_file(file_path):
             content = f.read()
 
         if content.startswith("---\n"):
-            match = re.match(r"^---\n(.*?)\n---\n(.*)$", content, re.DOTALL)
+            match = _FRONT_MATTER_RE.match(content)
             if match:
                 yaml_content = match.group(1)
                 markdown_content = match.group(2)
-                yaml_data = yaml.safe_load(yaml_content) if yaml_content.strip() else {}
+                # isspace() checks for blank front matter without copying it
+                if yaml_content and not yaml_content.isspace():
+                    yaml_data = yaml.safe_load(yaml_content)
+                else:
+                    yaml_data = {}
                 return yaml_data, markdown_content.strip()
 
             app_logger.warning(f"Invalid YAML front matter format in {file_path}")
@@ -50,6 +62,24 @@ def parse_webapp_file(file_path):
         return {}, ""
 
 
+async def _read_body(request: web.Request) -> bytes:
+    """
+    Read the request body, joining its chunks once when the length is known.
+
+    request.read() grows a bytearray chunk by chunk and then copies it into
+    bytes. With a declared Content-Length the size is known up front, so the
+    body is read with readexactly(), which assembles it in a single join.
+    """
+    length = request.content_length
+    if not length or length >= _MAX_PRESIZED_BODY:
+        return await request.read()
+    try:
+        return await request.content.readexactly(length)
+    except asyncio.IncompleteReadError as e:
+        # Client sent less than it declared; use what arrived, like read()
+        return e.partial
+
+
 async def get_raw_request_str(request: web.Request) -> str:
     """
     Constructs the raw HTTP request string from an aiohttp.web.Request object.
@@ -58,9 +88,8 @@ async def get_raw_request_str(request: web.Request) -> str:
         f"{request.method} {request.path_qs} "
         f"HTTP/{request.version.major}.{request.version.minor}"
     )
-    header_lines = [f"{key}: {value}" for key, value in request.headers.items()]
     body_str = ""
-    body_bytes = await request.read()
+    body_bytes = await _read_body(request)
     if body_bytes:
         charset = request.charset or "utf-8"
         try:
@@ -72,4 +101,12 @@ async def get_raw_request_str(request: web.Request) -> str:
             )
             body_str = body_bytes.decode("latin-1", "replace")
 
-    return "\r\n".join([raw_request_line_str] + header_lines + ["", body_str])
+    # Build the line list in one pass rather than concatenating partial lists
+    return "\r\n".join(
+        [
+            raw_request_line_str,
+            *(f"{key}: {value}" for key, value in request.headers.items()),
+            "",
+            body_str,
+        ]
+    )
@@ -1,32 +1,58 @@
 # src/server/streaming.py
 import asyncio
+import logging
+import re
 from typing import Any, AsyncGenerator
 
+import orjson
 from agents import Agent
 from agents.items import RunItem, ToolCallItem, ToolCallOutputItem
 from agents.stream_events import RawResponsesStreamEvent, RunItemStreamEvent
 from aiohttp import web
 from aiohttp.client_exceptions import ClientConnectionResetError
+from openai.types.responses import ResponseCompletedEvent, ResponseTextDeltaEvent
+from openai.types.responses.response_created_event import ResponseCreatedEvent
 
 from src.logging_config import get_loggers
 
 app_logger, _, _ = get_loggers()
 
+# Tool outputs at least this large are JSON-decoded in a worker thread so a
+# big generated page doesn't stall every other connection on the event loop
+_THREADED_DECODE_MIN_CHARS = 1 << 20
+
+# Body text longer than this is encoded and written a slice at a time, so a
+# whole generated page is never held as both str and bytes at once
+_WRITE_SLICE_CHARS = 64 * 1024
+
+# create_session returns 16 random bytes as 32 hex digits
+_HEX_SESSION_ID_RE = re.compile(r"[0-9a-f]{32}")
+
+
+def _looks_like_session_id(text: str) -> bool:
+    """Recognize a session ID tool result: hex, or the older dashed UUID form."""
+    if len(text) >= 100:
+        return False
+    return "-" in text or _HEX_SESSION_ID_RE.fullmatch(text.strip()) is not None
+
 
 class StreamingContext:
     def __init__(self, request: web.Request, agent: Agent):
         self.request = request
         self.agent = agent
         self.response = web.StreamResponse()
-        self.client_address_str = f"{request.remote}"
+        self.client_address_str = request.get("client_address_str") or (
+            request.remote or "Unknown Client"
+        )
         self.body_buffer = ""
         self.header_section = ""
         self.headers_and_status_parsed = False
         self.llm_response_fully_collected_text_for_log = ""
         self.model_error_indicator_for_recording: str | None = None
         self.separator = "\r\n\r\n"
-        self.llm_first_token_time: float | None = None
-        self.llm_stream_end_time: float | None = None
+        # time.monotonic_ns() timestamps, matching llm_call_start_ns
+        self.llm_first_token_ns: int | None = None
+        self.llm_stream_end_ns: int | None = None
         self.prompt_tokens_from_usage = 0
         self.completion_tokens_from_usage = 0
         self.total_tokens_from_usage = 0
@@ -44,14 +70,6 @@ class StreamingContext:
         async for event in agent_stream.stream_events():
             if isinstance(event, RawResponsesStreamEvent):
                 # Handle different types of response events
-                from openai.types.responses import (
-                    ResponseCompletedEvent,
-                    ResponseTextDeltaEvent,
-                )
-                from openai.types.responses.response_created_event import (
-                    ResponseCreatedEvent,
-                )
-
                 if isinstance(event.data, ResponseTextDeltaEvent):
                     # Handle text delta events (streaming content)
                     if event.data.delta:
@@ -101,15 +119,16 @@ class StreamingContext:
                                         await self.process_chunk(content_item.text)
                 elif isinstance(event.data, ResponseCreatedEvent):
                     # Handle response created events (initial response setup)
-                    app_logger.debug(
-                        "Response created",
-                        extra={
-                            "client_address": self.client_address_str,
-                            "response_id": event.data.response.id,
-                        },
-                    )
+                    if app_logger.isEnabledFor(logging.DEBUG):
+                        app_logger.debug(
+                            "Response created",
+                            extra={
+                                "client_address": self.client_address_str,
+                                "response_id": event.data.response.id,
+                            },
+                        )
                 # Handle other event types as needed
-                else:
+                elif app_logger.isEnabledFor(logging.DEBUG):
                     app_logger.debug(
                         "Unhandled raw response event type",
                         extra={
@@ -135,7 +154,7 @@ class StreamingContext:
                 self.response.set_status(200)
                 self.response.headers['Content-Type'] = 'text/plain; charset=utf-8'
                 await self.response.prepare(self.request)
-                await self.response.write(self.body_buffer.encode('utf-8'))
+                await self._write_text(self.body_buffer)
             else:
                 # If stream finishes with no headers and no content, it's likely
                 # an error or an empty response was intended.
@@ -161,25 +180,27 @@ class StreamingContext:
         return self.response, metrics
 
     async def handle_tool_calls(self, item: RunItem):
-        app_logger.debug(
-            "Handling tool calls",
-            extra={
-                "client_address": self.client_address_str,
-                "item": item,
-            },
-        )
+        if app_logger.isEnabledFor(logging.DEBUG):
+            app_logger.debug(
+                "Handling tool calls",
+                extra={
+                    "client_address": self.client_address_str,
+                    "item": item,
+                },
+            )
         if isinstance(item, ToolCallItem):
             raw_tool_call = item.raw_item
             if hasattr(raw_tool_call, "function") and raw_tool_call.function:
                 function_name = getattr(raw_tool_call.function, "name", "unknown")
                 # Log tool call at DEBUG level with function name
-                app_logger.debug(
-                    "Tool called",
-                    extra={
-                        "function_name": function_name,
-                        "client_address": self.client_address_str,
-                    },
-                )
+                if app_logger.isEnabledFor(logging.DEBUG):
+                    app_logger.debug(
+                        "Tool called",
+                        extra={
+                            "function_name": function_name,
+                            "client_address": self.client_address_str,
+                        },
+                    )
                 if function_name == "create_session":
                     # The create_session tool returns the new session ID directly
                     # We need to extract it from the result when it's available
@@ -213,14 +234,16 @@ class StreamingContext:
         if isinstance(output, str):
             # Try to parse as JSON 
             if output.startswith("{"):
-                import json
                 try:
-                    parsed = json.loads(output)
+                    if len(output) >= _THREADED_DECODE_MIN_CHARS:
+                        parsed = await asyncio.to_thread(orjson.loads, output)
+                    else:
+                        parsed = orjson.loads(output)
                     if isinstance(parsed, dict) and "text" in parsed:
                         text_content = parsed["text"]
                     else:
                         text_content = output
-                except json.JSONDecodeError:
+                except orjson.JSONDecodeError:
                     text_content = output
             else:
                 text_content = output
@@ -236,7 +259,7 @@ class StreamingContext:
             "Tool result | function_name=%s text=%s client_address=%s",
             function_name,
             text_content[:100] if len(text_content) > 100 else text_content,
-            self.request.remote,
+            self.client_address_str,
         )
         
         # Detect tool type by examining the extracted text content
@@ -247,18 +270,19 @@ class StreamingContext:
             # part of the HTTP response (e.g., explanatory text the LLM generated
             # before calling the tool)
             if self.body_buffer and not self.response.prepared:
-                app_logger.debug(
-                    "Clearing body_buffer before HTTP tool response",
-                    extra={
-                        "cleared_content": self.body_buffer[:100],
-                        "client_address": self.client_address_str,
-                    }
-                )
+                if app_logger.isEnabledFor(logging.DEBUG):
+                    app_logger.debug(
+                        "Clearing body_buffer before HTTP tool response",
+                        extra={
+                            "cleared_content": self.body_buffer[:100],
+                            "client_address": self.client_address_str,
+                        }
+                    )
                 self.body_buffer = ""
             await self.process_chunk(text_content)
             
-        elif len(text_content) < 100 and "-" in text_content:
-            # This looks like a session ID (UUID format)
+        elif _looks_like_session_id(text_content):
+            # This looks like a session ID from create_session
             session_id = text_content.strip()
             self.session_id_from_tool_call = session_id
             app_logger.info(
@@ -276,21 +300,23 @@ class StreamingContext:
         # parsing headers to streaming the body.
         try:
             if not self.response.prepared:
-                # Buffer until we find the separator
+                # Buffer until we find the separator. Earlier chunks were already
+                # searched, so only the new text (plus enough overlap to catch a
+                # separator split across chunks) needs scanning.
+                scan_from = max(len(self.body_buffer) - 3, 0)
                 self.body_buffer += chunk
                 self.llm_response_fully_collected_text_for_log += chunk
 
                 # Check for both possible separators
-                separator_found = None
-                if self.separator in self.body_buffer:
-                    separator_found = self.separator
-                elif "\n\n" in self.body_buffer:
-                    separator_found = "\n\n"
-
-                if separator_found:
-                    header_section, self.body_buffer = self.body_buffer.split(
-                        separator_found, 1
-                    )
+                separator_len = len(self.separator)
+                separator_at = self.body_buffer.find(self.separator, scan_from)
+                if separator_at == -1:
+                    separator_len = 2
+                    separator_at = self.body_buffer.find("\n\n", scan_from)
+
+                if separator_at != -1:
+                    header_section = self.body_buffer[:separator_at]
+                    self.body_buffer = self.body_buffer[separator_at + separator_len:]
                     self.header_section = header_section
                     app_logger.info(
                         "Parsing HTTP headers from LLM",
@@ -305,14 +331,14 @@ class StreamingContext:
                     await self._parse_and_prepare_response(
                         header_section, self.body_buffer
                     )
-                else:
+                elif app_logger.isEnabledFor(logging.DEBUG):
                     app_logger.debug(
                         "No header separator found yet, continuing to buffer",
                         extra={"client_address": self.client_address_str},
                     )
             else:
                 # Once headers are parsed, stream the rest of the body
-                await self.response.write(chunk.encode("utf-8"))
+                await self._write_text(chunk)
 
         except (ClientConnectionResetError, ConnectionResetError):
             app_logger.warning(
@@ -353,8 +379,8 @@ class StreamingContext:
             headers = {}
             for line in lines[1:]:
                 line = line.strip()
-                if ": " in line:
-                    key, value = line.split(": ", 1)
+                key, separator, value = line.partition(": ")
+                if separator:
                     headers[key] = value
 
             # Set status and headers BEFORE preparing the response
@@ -387,7 +413,7 @@ class StreamingContext:
 
             # Write initial body chunk if available
             if initial_body_chunk:
-                await self.response.write(initial_body_chunk.encode("utf-8"))
+                await self._write_text(initial_body_chunk)
 
         except (ClientConnectionResetError, ConnectionResetError):
             app_logger.warning(
@@ -395,10 +421,13 @@ class StreamingContext:
                 extra={"client_address": self.client_address_str},
             )
         except Exception as e:
-            app_logger.exception(
+            # Malformed model output, not a server bug: keep the traceback
+            # (and the cost of rendering it) for debug logging
+            app_logger.error(
                 "[%s] Error parsing LLM response headers: %s",
                 self.client_address_str,
                 e,
+                exc_info=app_logger.isEnabledFor(logging.DEBUG),
             )
             # Mark as error so we can potentially send a fallback
             self.model_error_indicator_for_recording = "header_parsing_error"
@@ -408,46 +437,17 @@ class StreamingContext:
             )
             await self.response.prepare(self.request)
 
+    async def _write_text(self, text: str):
+        """Write body text to the prepared response as UTF-8."""
+        if len(text) <= _WRITE_SLICE_CHARS:
+            await self.response.write(text.encode("utf-8"))
+            return
+        # aiohttp can apply write backpressure between slices
+        for start in range(0, len(text), _WRITE_SLICE_CHARS):
+            chunk = text[start : start + _WRITE_SLICE_CHARS]
+            await self.response.write(chunk.encode("utf-8"))
+
     @property
     def prepared(self) -> bool:
         return self.response.prepared
 
-
-class LLMResponseStreamer:
-    """
-    A streaming response handler that processes LLM output and converts it to
-    HTTP responses.
-    """
-
-    def __init__(self, client_address_str: str):
-        self.client_address_str = client_address_str
-
-    async def stream_response(
-        self,
-        request: web.Request,
-        agent_stream: AsyncGenerator[Any, None],
-        max_turns: int,
-        session_id: str | None,
-    ) -> tuple[web.StreamResponse, str | None, dict[str, Any]]:
-        """
-        Process the agent stream and return the response with metrics.
-
-        Returns:
-            A tuple of (response, final_session_id_for_turn, metrics)
-        """
-        # Get the agent from the request
-        agent = request.app["agent"]
-
-        # Create streaming context
-        context = StreamingContext(request, agent)
-
-        # Stream the response
-        response, metrics = await context.stream_agent_response(agent_stream)
-
-        # Add timing metrics
-        metrics["llm_first_token_time"] = context.llm_first_token_time
-        metrics["llm_stream_end_time"] = context.llm_stream_end_time
-
-        final_session_id_for_turn = context.session_id_from_tool_call or session_id
-
-        return response, final_session_id_for_turn, metrics
@@ -5,6 +5,8 @@ import sys
 from typing import TYPE_CHECKING
 
 import dspy
+import httpx
+import jinja2
 from dspy.teleprompt import BootstrapFewShot
 
 from src.dspy_metrics import http_response_metric
@@ -22,12 +24,21 @@ from agents.mcp import (
 )
 from agents.model_settings import ModelSettings
 from aiohttp import web
+from openai import DefaultAsyncHttpxClient
 
-from src.app import handle_http_request
-from src.config import Config, McpServerConfig
+from src.app import (
+    build_base_jinja_context,
+    build_handler_state,
+    compile_prompt,
+    handle_http_request,
+    load_debug_panel_prompt,
+)
+from src.config import Config, McpServerConfig, get_config
 from src.logging_config import get_loggers
 from src.dspy_module import HttpProgram
 from src.training_data import training_data
+from src.server.conversation_sessions import ConversationSessionCache
+from src.server.global_state import VersionedState
 from src.server.middleware import (
     error_handling_middleware,
     logging_and_metrics_middleware,
@@ -77,6 +88,7 @@ class WebServer:
         self.runner: web.AppRunner | None = None
         self.site: web.TCPSite | None = None
         self.agent: Agent | None = None
+        self.llm_http_client: httpx.AsyncClient | None = None
         self.mcp_server_lifecycles: list = []
 
     async def initialize_agent(self):
@@ -104,19 +116,24 @@ class WebServer:
                     len(mcp_servers_config),
                     mcp_cfg_dict,
                 )
-                mcp_config = McpServerConfig(**mcp_cfg_dict)
+                # Config already holds validated models; constructor configs are dicts
+                mcp_config = (
+                    mcp_cfg_dict
+                    if isinstance(mcp_cfg_dict, McpServerConfig)
+                    else McpServerConfig.model_validate(mcp_cfg_dict)
+                )
                 server = None
 
                 if mcp_config.type.lower() == "stdio":
                     # Handle simplified stdio config that just specifies a module
-                    if "module" in mcp_cfg_dict:
+                    if mcp_config.module is not None:
                         app_logger.debug(
                             "Using module-based stdio config: %s",
-                            mcp_cfg_dict["module"],
+                            mcp_config.module,
                         )
                         params = {
                             "command": sys.executable,
-                            "args": ["-m", mcp_cfg_dict["module"]],
+                            "args": ["-m", mcp_config.module],
                         }
                     else:
                         app_logger.debug("Using full stdio config")
@@ -167,8 +184,15 @@ class WebServer:
             app_logger.debug(
                 f"Using custom OpenAI client with base_url: {config.openai_base_url}"
             )
+            # One pooled HTTP client for every upstream LLM call this server makes
+            self.llm_http_client = DefaultAsyncHttpxClient(
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=50)
+            )
+            self.app["llm_http_client"] = self.llm_http_client
             custom_client = AsyncOpenAI(
-                api_key=config.api_key, base_url=config.openai_base_url
+                api_key=config.api_key,
+                base_url=config.openai_base_url,
+                http_client=self.llm_http_client,
             )
             model = OpenAIChatCompletionsModel(
                 model=config.openai_model_name, openai_client=custom_client
@@ -248,18 +272,35 @@ class WebServer:
         self.app.router.add_route("*", path, handler)
 
     async def start(self):
-        # Use config passed to constructor, or create new one from web_app_file
+        # Use config passed to constructor, or the shared one for web_app_file
         if self.config:
             config = self.config
-        elif self.web_app_file:
-            config = Config(web_app_file=self.web_app_file)
         else:
-            config = Config()
+            config = get_config(self.web_app_file)
 
         self.app["config"] = config
-        self.app["global_state"] = {}
+        self.app["global_state"] = VersionedState()
+        self.app["conversation_sessions"] = ConversationSessionCache(
+            history_limit=config.max_history_items
+        )
+        self.app["base_jinja_context"] = build_base_jinja_context(config)
+        # Compile the system prompt once; a template error fails startup
+        try:
+            self.app["system_prompt_template_compiled"] = compile_prompt(
+                config.system_prompt_template
+            )
+        except jinja2.exceptions.TemplateSyntaxError as e:
+            app_logger.error(f"Jinja2 template syntax error in the system prompt: {e}")
+            raise
+        # Resolve debug panel injection once; the handler only checks the flag
+        self.app["debug_injection_enabled"] = bool(config.debug)
+        self.app["debug_panel_prompt"] = (
+            load_debug_panel_prompt() if config.debug else ""
+        )
         self.add_route("/{path:.*}", handle_http_request)
         await self.initialize_agent()
+        # The handler reads everything it needs from this one app key
+        self.app["handler_state"] = build_handler_state(self.app)
         self.runner = web.AppRunner(self.app)
         await self.runner.setup()
         self.site = web.TCPSite(self.runner, self.host, self.port)
@@ -282,6 +323,10 @@ class WebServer:
                    MCP subprocesses will be terminated when the process exits.
         """
         await self.stop()
+
+        conversation_sessions = self.app.get("conversation_sessions")
+        if conversation_sessions is not None:
+            conversation_sessions.close()
         
         # Clean up MCP servers using their proper cleanup() method
         for server in self.mcp_server_lifecycles:
@@ -302,4 +347,8 @@ class WebServer:
                     app_logger.warning(f"MCP server cleanup error: {e}")
             except Exception as e:
                 app_logger.debug(f"MCP cleanup exception (may be expected): {e}")
-        self.mcp_server_lifecycles.clear()
\ No newline at end of file
+        self.mcp_server_lifecycles.clear()
+
+        if self.llm_http_client:
+            await self.llm_http_client.aclose()
+            self.llm_http_client = None
\ No newline at end of file
@@ -0,0 +1,184 @@
+import json
+
+import pytest
+
+from src.server.conversation_sessions import ConversationSessionCache, _recent_turns
+
+
+def _user(text):
+    return {"role": "user", "content": text}
+
+
+def _assistant(text):
+    return {"role": "assistant", "content": text}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    sessions = ConversationSessionCache(db_path=str(tmp_path / "sessions.db"))
+    yield sessions
+    sessions.close()
+
+
+@pytest.mark.asyncio
+async def test_item_count_follows_add_pop_and_clear(cache):
+    """The cached item count tracks writes made through the session."""
+    session, count = await cache.get_with_history_count("s1")
+    assert count == 0
+
+    await session.add_items([_user("hi"), _assistant("hello")])
+    assert session.item_count == 2
+
+    await session.add_items([_user("again")])
+    assert session.item_count == 3
+
+    assert await session.pop_item() == _user("again")
+    _, count = await cache.get_with_history_count("s1")
+    assert count == 2
+
+    await session.clear_session()
+    assert session.item_count == 0
+    assert await session.get_items() == []
+
+
+@pytest.mark.asyncio
+async def test_get_with_history_count_reuses_session(cache):
+    """The same session object is returned, with the stored item count."""
+    session, _ = await cache.get_with_history_count("s1")
+    await session.add_items([_user("hi"), _assistant("hello")])
+
+    again, count = await cache.get_with_history_count("s1")
+    assert again is session
+    assert count == 2
+    assert await again.get_items() == [_user("hi"), _assistant("hello")]
+
+
+@pytest.mark.asyncio
+async def test_history_written_by_another_cache_is_seen(tmp_path):
+    """A cached history is reloaded when another server writes to the session."""
+    db_path = str(tmp_path / "sessions.db")
+    first = ConversationSessionCache(db_path=db_path)
+    second = ConversationSessionCache(db_path=db_path)
+    try:
+        session, _ = await first.get_with_history_count("s1")
+        await session.add_items([_user("hi")])
+        assert await session.get_items() == [_user("hi")]
+
+        other, count = await second.get_with_history_count("s1")
+        assert count == 1
+        await other.add_items([_assistant("hello")])
+
+        assert await session.get_items() == [_user("hi"), _assistant("hello")]
+        _, count = await first.get_with_history_count("s1")
+        assert count == 2
+    finally:
+        first.close()
+        second.close()
+
+
+@pytest.mark.asyncio
+async def test_history_decodes_like_json_loads(tmp_path):
+    """Values orjson reads differently from json.loads are read like the SDK."""
+    db_path = str(tmp_path / "sessions.db")
+    items = [
+        {"role": "user", "content": "nan", "score": float("nan")},
+        {"role": "user", "content": "inf", "score": float("-inf")},
+        {"role": "user", "content": "wide", "score": 2**70},
+        {"role": "user", "content": "negative", "score": -(2**63) - 1},
+    ]
+    expected = json.dumps(items)
+
+    first = ConversationSessionCache(db_path=db_path)
+    second = ConversationSessionCache(db_path=db_path)
+    try:
+        session, _ = await first.get_with_history_count("s1")
+        # Load the (empty) history so the write below extends the cache
+        assert await session.get_items() == []
+        await session.add_items(items)
+        assert json.dumps(await session.get_items()) == expected
+
+        # A fresh cache decodes the stored rows
+        other, _ = await second.get_with_history_count("s1")
+        loaded = await other.get_items()
+        assert json.dumps(loaded) == expected
+        assert type(loaded[2]["score"]) is int
+    finally:
+        first.close()
+        second.close()
+
+
+@pytest.mark.asyncio
+async def test_evicted_session_stays_usable(tmp_path):
+    """A request holding an evicted session can keep reading and writing it."""
+    cache = ConversationSessionCache(
+        db_path=str(tmp_path / "sessions.db"), max_sessions=1
+    )
+    try:
+        session, _ = await cache.get_with_history_count("s1")
+        await session.add_items([_user("hi")])
+
+        # Opening another session evicts s1 from the cache
+        await cache.get_with_history_count("s2")
+        await session.add_items([_assistant("hello")])
+        assert await session.get_items() == [_user("hi"), _assistant("hello")]
+
+        reopened, count = await cache.get_with_history_count("s1")
+        assert reopened is not session
+        assert count == 2
+    finally:
+        cache.close()
+
+
+@pytest.mark.asyncio
+async def test_history_limit_trims_to_recent_turns(tmp_path):
+    """With a history limit, only the most recent whole turns are returned."""
+    cache = ConversationSessionCache(
+        db_path=str(tmp_path / "sessions.db"), history_limit=3
+    )
+    try:
+        session, _ = await cache.get_with_history_count("s1")
+        items = [
+            _user("one"),
+            _assistant("1"),
+            _user("two"),
+            _assistant("2"),
+            _user("three"),
+            _assistant("3"),
+        ]
+        await session.add_items(items)
+
+        assert await session.get_items() == items[4:]
+        # An explicit limit is applied as-is
+        assert await session.get_items(limit=3) == items[3:]
+        # The full history is still stored
+        _, count = await cache.get_with_history_count("s1")
+        assert count == 6
+    finally:
+        cache.close()
+
+
+def _tool_turn(text):
+    return [
+        _user(text),
+        {"type": "function_call", "call_id": f"call_{text}", "name": "lookup"},
+        {"type": "function_call_output", "call_id": f"call_{text}", "output": text},
+        _assistant(text),
+    ]
+
+
+def test_recent_turns_cuts_at_the_first_user_message_in_the_window():
+    """A tool call straddling the limit is dropped along with its whole turn."""
+    items = _tool_turn("one") + _tool_turn("two")
+    # The last 5 items start at the first turn's assistant message
+    assert _recent_turns(items, 5) == items[4:]
+    # Cutting at exactly the limit would have kept a function_call_output
+    # without its function_call
+    assert _recent_turns(items, 6) == items[4:]
+
+
+def test_recent_turns_keeps_the_latest_turn_whole():
+    """With no user message in the window, the latest turn exceeds the limit."""
+    items = _tool_turn("one") + _tool_turn("two")
+    assert _recent_turns(items, 3) == items[4:]
+    # Without any user message, nothing is dropped
+    assert _recent_turns(items[1:4], 2) == items[1:4]
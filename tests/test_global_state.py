@@ -0,0 +1,44 @@
+import json
+
+import pytest
+
+from src.server.global_state import VersionedState
+
+DARK = {"theme": "dark"}
+LIGHT = {"theme": "light"}
+WITH_USER = {"theme": "dark", "user": "bob"}
+
+
+@pytest.mark.parametrize(
+    "mutate, expected",
+    [
+        pytest.param(lambda s: s.__setitem__("theme", "light"), LIGHT, id="setitem"),
+        pytest.param(lambda s: s.__setitem__("user", "bob"), WITH_USER, id="add"),
+        pytest.param(lambda s: s.update(theme="light"), LIGHT, id="update-kwargs"),
+        pytest.param(lambda s: s.update({"user": "bob"}), WITH_USER, id="update"),
+        pytest.param(lambda s: s.pop("theme"), {}, id="pop"),
+        pytest.param(lambda s: s.clear(), {}, id="clear"),
+        pytest.param(lambda s: s.__delitem__("theme"), {}, id="delitem"),
+        pytest.param(lambda s: s.popitem(), {}, id="popitem"),
+        pytest.param(lambda s: s.setdefault("user", "bob"), WITH_USER, id="setdefault"),
+        pytest.param(lambda s: s.__ior__(LIGHT), LIGHT, id="ior"),
+    ],
+)
+def test_as_json_is_refreshed_after_modification(mutate, expected):
+    """Every modifying dict method invalidates the cached JSON."""
+    state = VersionedState(DARK)
+    assert json.loads(state.as_json()) == DARK
+
+    mutate(state)
+
+    assert json.loads(state.as_json()) == expected
+
+
+def test_as_json_is_cached_until_modified():
+    """Repeated calls without changes return the same serialized string."""
+    state = VersionedState(theme="dark")
+    first = state.as_json()
+    assert state.as_json() is first
+
+    state["theme"] = "light"
+    assert state.as_json() is not first
@@ -0,0 +1,35 @@
+import pytest
+
+from src.server.middleware import SESSION_COOKIE_NAME, _extract_cookie
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        pytest.param("session_id=abc123", "abc123", id="only-cookie"),
+        pytest.param("a=1; session_id=abc123; b=2", "abc123", id="middle"),
+        pytest.param("a=1;session_id=abc123", "abc123", id="no-space"),
+        pytest.param("a=1;   session_id=abc123  ;b=2", "abc123", id="extra-spaces"),
+        pytest.param("session_id=abc123;", "abc123", id="trailing-semicolon"),
+        pytest.param("session_id= abc123 ", "abc123", id="padded-value"),
+        pytest.param('session_id="abc123"', '"abc123"', id="quoted-keeps-quotes"),
+        pytest.param("xsession_id=bad; session_id=good", "good", id="prefixed-name"),
+        pytest.param("session_id_old=bad; session_id=good", "good", id="longer-name"),
+    ],
+)
+def test_extract_cookie_finds_value(header, expected):
+    assert _extract_cookie(header, SESSION_COOKIE_NAME) == expected
+
+
+@pytest.mark.parametrize(
+    "header",
+    [
+        pytest.param("", id="empty-header"),
+        pytest.param("a=1; b=2", id="missing"),
+        pytest.param("xsession_id=bad", id="only-prefixed-name"),
+        pytest.param("a=1; session_id=", id="empty-value"),
+        pytest.param("session_id=  ; a=1", id="blank-value"),
+    ],
+)
+def test_extract_cookie_returns_none(header):
+    assert _extract_cookie(header, SESSION_COOKIE_NAME) is None
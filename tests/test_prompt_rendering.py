@@ -0,0 +1,58 @@
+import jinja2
+import pytest
+
+from src.app import _compile_format_string, _PromptContext, compile_prompt
+
+CONTEXT = {"name": "World", "session_id": "abc123", "count": 3}
+
+
+def _jinja_render(source, context):
+    return jinja2.Template(source).render(context)
+
+
+@pytest.mark.parametrize(
+    "source",
+    [
+        "Hello {{ name }}!",
+        "Hello {{name}}, session {{ session_id }}\n",
+        "Windows\r\nline endings {{ count }}\r\n",
+        "Literal {braces} and {{ name }} in {json: 1}",
+        "Unknown {{ missing }} renders empty",
+        "No variables at all\n\n",
+    ],
+)
+def test_plain_templates_use_format_map_and_match_jinja(source):
+    """Bare {{ var }} templates take the fast path and render like Jinja."""
+    assert _compile_format_string(source) is not None
+    assert compile_prompt(source)(CONTEXT) == _jinja_render(source, CONTEXT)
+
+
+def test_prompt_context_layers_over_base():
+    """Per-request values override the base, and both reach the template."""
+    source = "{{ name }} {{ session_id }} {{ count }}"
+    context = _PromptContext(CONTEXT)
+    context["name"] = "Request"
+
+    expected = _jinja_render(source, {**CONTEXT, "name": "Request"})
+    assert compile_prompt(source)(context) == expected
+
+
+@pytest.mark.parametrize(
+    "source",
+    [
+        "{% if name %}Hi {{ name }}{% endif %}",
+        "{% for i in range(count) %}{{ i }}{% endfor %}",
+        "{# comment #}{{ name }}",
+        "{{ name | upper }}",
+        "{{ name ~ '!' }}",
+        "{{ true }}",
+        "{{- name -}}",
+    ],
+)
+def test_other_templates_fall_back_to_jinja(source):
+    """Control flow, filters and expressions are rendered by Jinja."""
+    assert _compile_format_string(source) is None
+    assert compile_prompt(source)(CONTEXT) == _jinja_render(source, CONTEXT)
+    assert compile_prompt(source)(_PromptContext(CONTEXT)) == _jinja_render(
+        source, CONTEXT
+    )